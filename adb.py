@@ -1,9 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import random
-import time
 import threading
 
+from ui_events import UiEvents
+from block_devices import BlockDeviceScanner, device_label
+from android_install import IsoError, format_report, install, mount_point_for
+from data_image import DataImageError, create_data_image
+from iso_catalog import IsoCatalog, STATUS_MISMATCH, STATUS_VERIFIED, check_in_background, describe
+
 class AndroidInstallerApp:
     def __init__(self, root):
         self.root = root
@@ -19,12 +23,25 @@ class AndroidInstallerApp:
         style.configure("Header.TLabel", font=("Arial", 14, "bold"), background="#0099cc", foreground="white")
         style.configure("TButton", font=("Arial", 10, "bold"), padding=5)
 
+        # Worker threads post progress and log lines here; the Tk thread drains them on a tick
+        self.events = UiEvents(root)
+        self.events.on("log", self.write_log)
+        self.events.on("install", self.show_progress)
+        self.events.on("iso", self.show_iso_progress)
+
         self.current_step = 0
         self.iso_path = ""
+        self.iso_check = None # Catalog entry for iso_path once hashing finishes
+        self.iso_catalog = IsoCatalog()
         self.target_drive = ""
+        # Disks and partitions, rescanned only when the kernel reports a block device change
+        self.scanner = BlockDeviceScanner()
+        self.drives = []
         
         self.create_widgets()
         self.show_step(0)
+        self.populate_drives()
+        self.scanner.start_watching(on_change=lambda: self.events.call(self.populate_drives))
 
     def create_widgets(self):
         # 1. Header Area (Android Blue)
@@ -57,6 +74,11 @@ class AndroidInstallerApp:
         
         btn_browse = ttk.Button(self.step_0, text="Browse...", command=self.browse_iso)
         btn_browse.pack(pady=10)
+
+        self.iso_progress = ttk.Progressbar(self.step_0, orient=tk.HORIZONTAL, length=400, mode='determinate')
+        self.iso_progress.pack(pady=5)
+        self.iso_status = ttk.Label(self.step_0, text="")
+        self.iso_status.pack()
         
         btn_next_iso = ttk.Button(self.step_0, text="Next >", command=lambda: self.validate_step_0())
         btn_next_iso.pack(pady=20)
@@ -69,15 +91,6 @@ class AndroidInstallerApp:
         self.drive_list = tk.Listbox(self.step_1, height=6, font=("Courier", 10), selectmode=tk.SINGLE)
         self.drive_list.pack(fill=tk.X, pady=10)
         
-        # Mock drives
-        drives = [
-            "1. /dev/sda1   Windows NTFS   120 GB",
-            "2. /dev/sda2   Data NTFS      200 GB",
-            "3. /dev/sdb    Unallocated    500 GB"
-        ]
-        for d in drives:
-            self.drive_list.insert(tk.END, d)
-        
         btn_next_drive = ttk.Button(self.step_1, text="Next >", command=lambda: self.validate_step_1())
         btn_next_drive.pack(pady=20)
 
@@ -94,7 +107,7 @@ class AndroidInstallerApp:
         self.data_scale.configure(command=lambda v: self.data_label.config(text=f"{int(float(v))} MB"))
         self.data_label.pack()
         
-        btn_next_size = ttk.Button(self.step_2, text="Install >", command=lambda: self.show_step(3))
+        btn_next_size = ttk.Button(self.step_2, text="Install >", command=lambda: self.go_to_step(3))
         btn_next_size.pack(pady=20)
 
         # --- Step 3: Installation / Copying ---
@@ -117,8 +130,12 @@ class AndroidInstallerApp:
         self.btn_reboot_device.pack(side=tk.LEFT, padx=10)
 
     def log(self, message):
+        """Thread-safe; lines are written in batches on the next tick."""
+        self.events.log("log", message)
+
+    def write_log(self, messages):
         self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, f"> {message}\n")
+        self.log_text.insert(tk.END, "".join(f"> {message}\n" for message in messages))
         self.log_text.see(tk.END)
         self.log_text.config(state='disabled')
 
@@ -142,14 +159,59 @@ class AndroidInstallerApp:
         )
         if filename:
             self.iso_path = filename
+            self.iso_check = None
             self.iso_entry.delete(0, tk.END)
             self.iso_entry.insert(0, filename)
+            self.iso_status.config(text="Checking image...")
+            check_in_background(
+                self.iso_catalog, filename,
+                lambda done, total: self.events.progress("iso", filename, done, total),
+                lambda entry, error: self.events.call(self.show_iso_result, filename, entry, error))
+
+    def show_iso_progress(self, filename, done, total):
+        if filename == self.iso_path:
+            self.iso_progress.configure(value=100 * done / total if total else 100)
+
+    def show_iso_result(self, filename, entry, error):
+        if filename != self.iso_path:
+            return # Another image was picked while this one was hashing
+        if error:
+            self.iso_status.config(text=f"Cannot read image: {error}")
+            self.log(f"Cannot read {filename}: {error}")
+            self.iso_path = "" # Make the user pick a readable image
+            return
+        self.iso_check = entry
+        self.iso_progress.configure(value=100)
+        self.iso_status.config(text=describe(entry))
+        self.log(f"{describe(entry)} (sha256 {entry['digests']['sha256'][:16]}...)")
+
+    def populate_drives(self):
+        """Fills the target list from the scanner's (cached) device list, keeping the selection."""
+        selection = self.drive_list.curselection()
+        selected = self.drives[selection[0]].path if selection else None
+        self.drives = self.scanner.devices()
+        self.drive_list.delete(0, tk.END)
+        for index, device in enumerate(self.drives):
+            indent = "  " if device.is_partition else ""
+            self.drive_list.insert(tk.END, indent + device_label(device))
+            if device.path == selected:
+                self.drive_list.selection_set(index)
 
     def validate_step_0(self):
         if not self.iso_path:
             messagebox.showerror("Error", "Please select an ISO file.")
             return
+        if self.iso_check is None:
+            messagebox.showinfo("Please Wait", "The ISO image is still being checked.")
+            return
+        if self.iso_check["status"] == STATUS_MISMATCH:
+            messagebox.showerror("Error", "The ISO does not match its checksum file. Download it again.")
+            return
+        if self.iso_check["status"] != STATUS_VERIFIED and not messagebox.askyesno(
+                "Unverified Image", "No checksum file was found next to the ISO. Continue anyway?"):
+            return
         self.log(f"ISO Selected: {self.iso_path.split('/')[-1]}")
+        self.populate_drives()
         self.show_step(1)
 
     def validate_step_1(self):
@@ -157,38 +219,66 @@ class AndroidInstallerApp:
         if not selection:
             messagebox.showerror("Error", "Please select a target drive.")
             return
-        self.target_drive = self.drive_list.get(selection[0]).split()[1] # Get /dev/sdX
+        device = self.drives[selection[0]]
+        if device.mountpoint is None:
+            messagebox.showerror("Error", f"{device.path} is not mounted. Mount the partition to install to first.")
+            return
+        self.target_drive = device.path
         self.log(f"Target Drive: {self.target_drive}")
         self.show_step(2)
 
-    def show_step(self, index):
+    def go_to_step(self, index):
         self.show_step(index)
         if index == 3:
             # Start installation in a separate thread to keep GUI responsive
-            threading.Thread(target=self.run_installation_process, daemon=True).start()
-
-    def run_installation_process(self):
-        steps = [
-            ("Formatting partition...", 5),
-            ("Creating file system...", 10),
-            ("Copying ISO files...", 30),
-            ("Extracting system.sfs...", 50),
-            ("Installing bootloader...", 75),
-            ("Writing configuration...", 90),
-            ("Installation Complete!", 100)
-        ]
-        
-        for status, percentage in steps:
-            time.sleep(random.uniform(0.5, 1.5)) # Simulate work
-            self.update_progress(percentage, status)
-            self.log(status)
+            data_size_mb = int(float(self.data_scale.get())) # Tk widgets are read on the Tk thread only
+            threading.Thread(target=self.run_installation_process, args=(data_size_mb,), daemon=True).start()
+
+    def run_installation_process(self, data_size_mb):
+        target = mount_point_for(self.target_drive)
+        if target is None:
+            self.update_progress(0, f"{self.target_drive} is not mounted")
+            self.log(f"Error: mount {self.target_drive} before installing to it.")
+            return
+
+        def on_progress(done, total, name):
+            self.update_progress(100 * done / total, f"Copying {name}... {done // (1024 * 1024)} / {total // (1024 * 1024)} MB")
+
+        try:
+            install_dir, report = install(self.iso_path, target, progress=on_progress, log=self.log)
+        except (OSError, IsoError) as e:
+            self.update_progress(0, "Installation failed")
+            self.log(f"Error: {e}")
+            return
+        for line in format_report(report):
+            self.log(line)
+        if any(item["status"] == STATUS_MISMATCH for item in report):
+            self.update_progress(100, "Verification FAILED - the copied files are corrupt")
+            self.log("Error: checksum mismatch; re-download the ISO or try another USB port/drive.")
+            return
+
+        def on_data_progress(done, total, name):
+            self.update_progress(100 * done / total, f"Creating {name}... {done // (1024 * 1024)} / {total // (1024 * 1024)} MB")
+
+        try:
+            create_data_image(install_dir, data_size_mb, progress=on_data_progress, log=self.log)
+        except (OSError, DataImageError) as e:
+            self.update_progress(100, "Data image failed")
+            self.log(f"Error: {e}")
+            return
+        self.log(f"Add {install_dir}/grub-entry.cfg to your GRUB configuration to boot Android-x86.")
+        self.update_progress(100, "Installation Complete!")
 
         # Enable buttons at the end
-        self.root.after(0, lambda: self.btn_finish_frame.pack(pady=20))
+        self.events.call(lambda: self.btn_finish_frame.pack(pady=20))
 
     def update_progress(self, value, text):
-        self.root.after(0, lambda: self.progress_bar.configure(value=value))
-        self.root.after(0, lambda: self.status_label.configure(text=text))
+        """Thread-safe; only the latest value posted before a tick is drawn."""
+        self.events.progress("install", value, text)
+
+    def show_progress(self, value, text):
+        self.progress_bar.configure(value=value)
+        self.status_label.configure(text=text)
 
     def reboot_pc(self):
         self.log("Rebooting PC Now...")
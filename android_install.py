@@ -0,0 +1,332 @@
+import collections
+import errno
+import hashlib
+import os
+import shutil
+import struct
+
+from block_devices import read_mount_table
+from iso_catalog import STATUS_MISMATCH, STATUS_UNVERIFIED, STATUS_VERIFIED, parse_checksum_lines
+
+# --- Configuration ---
+BUFFER_SIZE = 16 * 1024 * 1024 # Bytes per copy call; also the progress granularity
+INSTALL_SUBDIR = "android-x86" # Directory created on the target partition
+SECTOR_SIZE = 2048
+BOOT_FILES = ("kernel", "initrd.img") # Required
+OPTIONAL_FILES = ("ramdisk.img",) # Dropped from newer Android-x86 releases
+SYSTEM_IMAGES = ("system.sfs", "system.efs", "system.img") # First one found is installed
+MANIFEST_FILES = ("sha256sum.txt", "SHA256SUMS", "sha1sum.txt", "md5sum.txt", "MD5SUMS") # Checksum lists on the ISO
+MANIFEST_MAX_BYTES = 1024 * 1024
+
+# copy_file_range/sendfile refuse some file pairs (cross-device, FUSE, Windows filesystems);
+# these errors mean "use the next method", anything else is a real I/O error
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP}
+
+class IsoError(Exception):
+    """Raised for unreadable images, missing install files or a target that cannot hold them."""
+
+# source: file to read; extents: [(byte offset, length)], more than one for multi-extent ISO files
+IsoEntry = collections.namedtuple("IsoEntry", "name is_dir source extents size")
+
+def _rock_ridge_name(system_use):
+    """Returns the Rock Ridge NM (alternate name) from a record's system use area, if any."""
+    name = b""
+    i = 0
+    while i + 4 <= len(system_use):
+        signature, length = system_use[i:i + 2], system_use[i + 2]
+        if length < 4:
+            break
+        if signature == b"NM" and length >= 5:
+            name += system_use[i + 5:i + length]
+        i += length
+    return name.decode("utf-8", errors="replace") if name else None
+
+class IsoImage:
+    """Read-only ISO9660 reader (with Rock Ridge names) that locates files for streaming."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            self.root = self._read_primary_descriptor()
+        except Exception:
+            os.close(self.fd)
+            raise
+
+    def _read(self, offset, length):
+        data = os.pread(self.fd, length, offset)
+        if len(data) != length:
+            raise IsoError(f"{self.path}: truncated image")
+        return data
+
+    def _read_primary_descriptor(self):
+        sector = 16
+        while True:
+            descriptor = self._read(sector * SECTOR_SIZE, SECTOR_SIZE)
+            if descriptor[1:6] != b"CD001":
+                raise IsoError(f"{self.path}: not an ISO9660 image")
+            if descriptor[0] == 1:
+                break
+            if descriptor[0] == 255:
+                raise IsoError(f"{self.path}: no primary volume descriptor")
+            sector += 1
+        self.block_size = struct.unpack_from("<H", descriptor, 128)[0]
+        return self._parse_record(descriptor[156:190])[0]
+
+    def _parse_record(self, record):
+        lba, size = struct.unpack_from("<I", record, 2)[0], struct.unpack_from("<I", record, 10)[0]
+        flags, name_length = record[25], record[32]
+        raw_name = record[33:33 + name_length]
+        system_use = record[33 + name_length + (1 - name_length % 2):]
+        name = _rock_ridge_name(system_use)
+        if name is None:
+            if raw_name in (b"\x00", b"\x01"):
+                name = "." if raw_name == b"\x00" else ".."
+            else:
+                name = raw_name.decode("ascii", errors="replace").split(";")[0].rstrip(".").lower()
+        return IsoEntry(name, bool(flags & 2), self.path, [(lba * self.block_size, size)], size), flags
+
+    def listdir(self, entry=None):
+        """Returns {name: IsoEntry} for a directory entry (the root by default)."""
+        offset, length = (entry or self.root).extents[0]
+        data = self._read(offset, length)
+        entries = {}
+        pending = None # Multi-extent file whose final record has not been seen yet
+        i = 0
+        while i < len(data):
+            record_length = data[i]
+            if record_length == 0:
+                i = (i // SECTOR_SIZE + 1) * SECTOR_SIZE # Records never span sectors
+                continue
+            entry, flags = self._parse_record(data[i:i + record_length])
+            i += record_length
+            if entry.name in (".", ".."):
+                continue
+            if pending is not None:
+                entry = entry._replace(extents=pending.extents + entry.extents, size=pending.size + entry.size)
+            pending = entry if flags & 0x80 else None
+            if pending is None:
+                entries[entry.name] = entry
+        return entries
+
+    def find(self, path):
+        """Looks up a slash-separated path case-insensitively; returns an IsoEntry or None."""
+        entry = self.root
+        for part in [p for p in path.split("/") if p]:
+            children = {name.lower(): child for name, child in self.listdir(entry).items()}
+            entry = children.get(part.lower())
+            if entry is None:
+                return None
+        return entry
+
+    def close(self):
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class DirectorySource:
+    """An already (loop-)mounted ISO, read through the filesystem with the same interface."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def find(self, path):
+        full = os.path.join(self.path, *[p for p in path.split("/") if p])
+        if not os.path.exists(full):
+            return None
+        size = 0 if os.path.isdir(full) else os.path.getsize(full)
+        return IsoEntry(os.path.basename(full), os.path.isdir(full), full, [(0, size)], size)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_source(path):
+    """Opens an ISO file or a directory where one is mounted."""
+    return DirectorySource(path) if os.path.isdir(path) else IsoImage(path)
+
+def plan_install(source):
+    """Returns [(target name, IsoEntry)] to install, raising IsoError if required files are missing."""
+    plan = []
+    for name in BOOT_FILES:
+        entry = source.find(name)
+        if entry is None or entry.is_dir:
+            raise IsoError(f"'{name}' not found on the image; is this an Android-x86 ISO?")
+        plan.append((name, entry))
+    for name in OPTIONAL_FILES:
+        entry = source.find(name)
+        if entry is not None and not entry.is_dir:
+            plan.append((name, entry))
+    for name in SYSTEM_IMAGES:
+        entry = source.find(name)
+        if entry is not None and not entry.is_dir:
+            plan.append((name, entry))
+            break
+    else:
+        raise IsoError(f"No system image ({', '.join(SYSTEM_IMAGES)}) found on the image")
+    return plan
+
+def read_manifest(source):
+    """
+    Returns {file name: (algorithm, hexdigest)} from the checksum lists shipped on the image,
+    or an empty dict if it has none.
+    """
+    expected = {}
+    for name in MANIFEST_FILES:
+        entry = source.find(name)
+        if entry is None or entry.is_dir or entry.size > MANIFEST_MAX_BYTES:
+            continue
+        with open(entry.source, "rb") as f:
+            data = b""
+            for offset, length in entry.extents:
+                f.seek(offset)
+                data += f.read(length)
+        for file_name, digest in parse_checksum_lines(data.decode("utf-8", errors="replace").splitlines()).items():
+            expected.setdefault(file_name, digest) # Earlier (stronger) manifests win
+    return expected
+
+def _write_all(fd, view):
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+def copy_range(src_fd, dst_fd, offset, length, on_bytes, buffer_size=BUFFER_SIZE, hasher=None):
+    """
+    Appends length bytes read at offset of src_fd to dst_fd. Prefers copy_file_range
+    (in-kernel, may share blocks), then sendfile, then buffered reads into one reused buffer.
+    With a hasher the data has to pass through user space anyway, so the buffered path is
+    used and each chunk is hashed between the read and the write.
+    on_bytes(count) is called after every chunk written.
+    """
+    use_copy_range = hasher is None and hasattr(os, "copy_file_range")
+    use_sendfile = hasher is None and hasattr(os, "sendfile")
+    buffer = None
+    done = 0
+    while done < length:
+        count = min(buffer_size, length - done)
+        try:
+            if use_copy_range:
+                copied = os.copy_file_range(src_fd, dst_fd, count, offset + done)
+            elif use_sendfile:
+                copied = os.sendfile(dst_fd, src_fd, offset + done, count)
+            else:
+                if buffer is None:
+                    buffer = memoryview(bytearray(buffer_size))
+                copied = os.preadv(src_fd, [buffer[:count]], offset + done)
+                if hasher is not None:
+                    hasher.update(buffer[:copied])
+                _write_all(dst_fd, buffer[:copied])
+        except OSError as e:
+            if e.errno in FALLBACK_ERRNOS and (use_copy_range or use_sendfile):
+                if use_copy_range:
+                    use_copy_range = False
+                else:
+                    use_sendfile = False
+                continue
+            raise
+        if copied == 0:
+            raise IsoError("Unexpected end of image while copying")
+        done += copied
+        on_bytes(copied)
+
+def grub_entry(subdir=INSTALL_SUBDIR):
+    """GRUB menu entry that boots the installed files; add it to e.g. /etc/grub.d/40_custom."""
+    return (f'menuentry "Android-x86" {{\n'
+            f'    search --no-floppy --set=root --file /{subdir}/kernel\n'
+            f'    linux /{subdir}/kernel root=/dev/ram0 SRC=/{subdir} quiet\n'
+            f'    initrd /{subdir}/initrd.img\n'
+            f'}}\n')
+
+def install(iso_path, target_dir, progress=None, log=print, subdir=INSTALL_SUBDIR, buffer_size=BUFFER_SIZE,
+            verify=True):
+    """
+    Streams the kernel, initrd(s) and system image from iso_path (an ISO file or mounted
+    directory) to target_dir/subdir. progress(done_bytes, total_bytes, name) is called as
+    data is written. Each file is written under a .part name and renamed once synced, so an
+    interrupted install never leaves a truncated file under its final name.
+    With verify, files listed in the image's checksum manifest are hashed as they are copied
+    (no second read of the target).
+    Returns (install directory, report), where report has one dict per file with name,
+    algorithm, expected, actual and status (verified, mismatch or unverified).
+    """
+    install_dir = os.path.join(target_dir, subdir)
+    report = []
+    with open_source(iso_path) as source:
+        plan = plan_install(source)
+        manifest = read_manifest(source) if verify else {}
+        total = sum(entry.size for _, entry in plan)
+        os.makedirs(install_dir, exist_ok=True)
+        free = shutil.disk_usage(install_dir).free
+        if free < total:
+            raise IsoError(f"Target needs {total // (1024 * 1024)} MB but only {free // (1024 * 1024)} MB is free")
+
+        done = 0
+        for name, entry in plan:
+            log(f"Copying {name} ({entry.size // (1024 * 1024)} MB)...")
+            algorithm, expected = manifest.get(name, (None, None))
+            hasher = hashlib.new(algorithm) if algorithm else None
+            destination = os.path.join(install_dir, name)
+            partial = destination + ".part"
+
+            def on_bytes(count, name=name):
+                nonlocal done
+                done += count
+                if progress:
+                    progress(done, total, name)
+
+            src_fd = os.open(entry.source, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            try:
+                dst_fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+                try:
+                    for offset, length in entry.extents:
+                        copy_range(src_fd, dst_fd, offset, length, on_bytes, buffer_size, hasher)
+                    os.fsync(dst_fd)
+                finally:
+                    os.close(dst_fd)
+            finally:
+                os.close(src_fd)
+            os.replace(partial, destination)
+
+            actual = hasher.hexdigest() if hasher else None
+            if hasher is None:
+                status = STATUS_UNVERIFIED
+            else:
+                status = STATUS_VERIFIED if actual == expected else STATUS_MISMATCH
+            report.append({"name": name, "algorithm": algorithm, "expected": expected, "actual": actual,
+                           "status": status})
+
+    with open(os.path.join(install_dir, "grub-entry.cfg"), "w") as f:
+        f.write(grub_entry(subdir))
+    log(f"Installed {len(plan)} files to {install_dir}")
+    return install_dir, report
+
+def format_report(report):
+    """One line per installed file for the installer log."""
+    lines = []
+    for item in report:
+        if item["status"] == STATUS_VERIFIED:
+            lines.append(f"{item['name']}: OK ({item['algorithm']})")
+        elif item["status"] == STATUS_MISMATCH:
+            lines.append(f"{item['name']}: MISMATCH ({item['algorithm']} expected {item['expected'][:16]}..., "
+                         f"got {item['actual'][:16]}...)")
+        else:
+            lines.append(f"{item['name']}: not listed in the image's checksum manifest")
+    return lines
+
+def mount_point_for(device, mounts="/proc/mounts"):
+    """Where device is mounted, or None. A directory is returned as is (already a mount point)."""
+    if os.path.isdir(device):
+        return device
+    for mounted, mount_point, _ in read_mount_table(mounts):
+        if mounted == device:
+            return mount_point
+    return None
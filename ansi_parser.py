@@ -0,0 +1,182 @@
+import functools
+import re
+
+# --- Configuration ---
+MAX_PENDING = 4096 # Longest unfinished sequence held back between chunks
+MAX_TRANSITIONS = 4096 # Memoised SGR transitions before the table is cleared
+
+# Windows Terminal "Campbell" scheme, matching the console's #0c0c0c / #cccccc defaults
+BASE_COLORS = (
+    "#0c0c0c", "#c50f1f", "#13a10e", "#c19c00", "#0037da", "#881798", "#3a96dd", "#cccccc",
+    "#767676", "#e74856", "#16c60c", "#f9f1a5", "#3b78ff", "#b4009e", "#61d6d6", "#f2f2f2",
+)
+CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+# CSI (ESC [ ... final), OSC (ESC ] ... BEL or ESC \), and two-byte escapes (charsets, keypad modes)
+SEQUENCE = re.compile(r"\x1b(?:\[([0-?]*)[ -/]*([@-~])|\][^\x07\x1b]*(?:\x07|\x1b\\)|[()*+][ -~]|[ -~])")
+# A sequence cut off by the end of a read; kept until the next one completes it
+PARTIAL = re.compile(r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?|[()*+])?\Z")
+
+def color_256(index):
+    """Hex colour of an xterm 256-colour index."""
+    if index < 16:
+        return BASE_COLORS[index]
+    if index < 232:
+        index -= 16
+        r, g, b = CUBE_LEVELS[index // 36], CUBE_LEVELS[index // 6 % 6], CUBE_LEVELS[index % 6]
+        return f"#{r:02x}{g:02x}{b:02x}"
+    gray = 8 + 10 * (index - 232)
+    return f"#{gray:02x}{gray:02x}{gray:02x}"
+
+def nearest_256(r, g, b):
+    """Maps a 24-bit colour onto the 256-colour palette, which bounds the number of tags."""
+    def level(value):
+        return 0 if value < 48 else 1 if value < 115 else (value - 35) // 40
+    cube = 16 + 36 * level(r) + 6 * level(g) + level(b)
+    gray_step = max(0, min(23, (round((r + g + b) / 3) - 8) // 10))
+    candidates = (cube, 232 + gray_step)
+
+    def distance(index):
+        hex_color = color_256(index)
+        return sum((int(hex_color[i:i + 2], 16) - v) ** 2 for i, v in zip((1, 3, 5), (r, g, b)))
+    return min(candidates, key=distance)
+
+def tag_options(tag, font=("Consolas", 11), foreground="#cccccc", background="#0c0c0c"):
+    """Tk tag_config options for a tag produced by AnsiParser."""
+    kind, _, value = tag.partition("-")
+    if kind == "fg":
+        return {"foreground": background if value == "inverse" else color_256(int(value))}
+    if kind == "bg":
+        return {"background": foreground if value == "inverse" else color_256(int(value))}
+    if kind == "font":
+        style = {"b": "bold", "i": "italic", "bi": "bold italic"}[value]
+        return {"font": (font[0], font[1], style)}
+    if tag == "underline":
+        return {"underline": True}
+    if tag == "strike":
+        return {"overstrike": True}
+    if tag == "dim":
+        return {"foreground": BASE_COLORS[8]}
+    return {}
+
+# SGR state: (fg, bg, bold, dim, italic, underline, inverse, strike); colours are 0..255 or None
+DEFAULT_STATE = (None, None, False, False, False, False, False, False)
+FLAG_ON = {1: 2, 2: 3, 3: 4, 4: 5, 7: 6, 9: 7}
+FLAG_OFF = {22: (2, 3), 23: (4,), 24: (5,), 27: (6,), 29: (7,)}
+
+def _next_state(state, params):
+    """Applies the parameters of one SGR sequence ("ESC [ params m") to a state."""
+    state = list(state)
+    codes = [int(p) if p.isdigit() else 0 for p in params.replace(":", ";").split(";")]
+    i = 0
+    while i < len(codes):
+        code = codes[i]
+        if code == 0:
+            state = list(DEFAULT_STATE)
+        elif code in FLAG_ON:
+            state[FLAG_ON[code]] = True
+        elif code in FLAG_OFF:
+            for field in FLAG_OFF[code]:
+                state[field] = False
+        elif 30 <= code <= 37 or 90 <= code <= 97:
+            state[0] = code - 30 if code < 90 else code - 90 + 8
+        elif 40 <= code <= 47 or 100 <= code <= 107:
+            state[1] = code - 40 if code < 100 else code - 100 + 8
+        elif code in (39, 49):
+            state[0 if code == 39 else 1] = None
+        elif code in (38, 48) and i + 1 < len(codes):
+            color = None
+            if codes[i + 1] == 5 and i + 2 < len(codes):
+                color = codes[i + 2] % 256
+                i += 2
+            elif codes[i + 1] == 2 and i + 4 < len(codes):
+                color = nearest_256(*(min(255, c) for c in codes[i + 2:i + 5]))
+                i += 4
+            else:
+                i += 1
+            if color is not None:
+                state[0 if code == 38 else 1] = color
+        i += 1
+    return tuple(state)
+
+@functools.lru_cache(maxsize=None)
+def _state_tags(state):
+    fg, bg, bold, dim, italic, underline, inverse, strike = state
+    if inverse:
+        fg, bg = (bg if bg is not None else "inverse"), (fg if fg is not None else "inverse")
+    tags = []
+    if fg is not None:
+        tags.append(f"fg-{fg}")
+    elif dim:
+        tags.append("dim")
+    if bg is not None:
+        tags.append(f"bg-{bg}")
+    if bold or italic:
+        tags.append("font-" + ("b" if bold else "") + ("i" if italic else ""))
+    if underline:
+        tags.append("underline")
+    if strike:
+        tags.append("strike")
+    return tuple(tags)
+
+class AnsiParser:
+    """
+    Incremental parser for terminal output. feed() takes text as it arrives, in any chunking,
+    and returns (text, tags) segments with escape sequences removed and SGR attributes turned
+    into tag names: fg-<0..255>, bg-<0..255>, fg-inverse/bg-inverse, font-b/i/bi, underline,
+    strike and dim. Truecolour is mapped onto the 256-colour palette so the set of tags stays
+    bounded. Each call is linear in the length of the chunk.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        # Build logs repeat a handful of sequences, so (state, params) -> state is memoised
+        self.transitions = {}
+        self.reset()
+
+    def reset(self):
+        self.state = DEFAULT_STATE
+        self.tags = ()
+
+    def _apply_sgr(self, params):
+        key = (self.state, params)
+        state = self.transitions.get(key)
+        if state is None:
+            if len(self.transitions) >= MAX_TRANSITIONS:
+                self.transitions.clear()
+            state = self.transitions[key] = _next_state(self.state, params)
+        self.state = state
+        self.tags = _state_tags(state)
+
+    def feed(self, text):
+        """Returns [(text, tags tuple)] for a chunk of output."""
+        text = self.pending + text
+        self.pending = ""
+        # Hold back an unfinished escape sequence or a \r that may be the first half of \r\n
+        partial = PARTIAL.search(text, max(0, len(text) - MAX_PENDING))
+        if partial is not None and partial.start() < len(text):
+            self.pending = text[partial.start():]
+            text = text[:partial.start()]
+        elif text.endswith("\r"):
+            self.pending = "\r"
+            text = text[:-1]
+
+        segments = []
+        position = 0
+        for match in SEQUENCE.finditer(text):
+            self._add(segments, text[position:match.start()])
+            if match.group(2) == "m":
+                self._apply_sgr(match.group(1))
+            position = match.end()
+        self._add(segments, text[position:])
+        return segments
+
+    def _add(self, segments, text):
+        if "\r" in text or "\x07" in text or "\x08" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "").replace("\x07", "").replace("\x08", "")
+        if not text:
+            return
+        if segments and segments[-1][1] == self.tags:
+            segments[-1] = (segments[-1][0] + text, self.tags)
+        else:
+            segments.append((text, self.tags))
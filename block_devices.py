@@ -0,0 +1,197 @@
+import collections
+import os
+import re
+import socket
+import struct
+import threading
+
+# --- Configuration ---
+SKIP_PREFIXES = ("ram", "zram", "fd", "sr") # Never install targets; read-only devices are skipped too
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_BUFFER = 64 * 1024
+SIGNATURE_BYTES = 68 * 1024 # Enough to reach the btrfs superblock magic
+
+BlockDevice = collections.namedtuple(
+    "BlockDevice", "name path size is_partition parent removable model fstype mountpoint")
+
+# (offset, magic, filesystem), checked in order against the start of the device
+SIGNATURES = (
+    (0, b"LUKS\xba\xbe", "crypto_LUKS"),
+    (0, b"XFSB", "xfs"),
+    (0, b"hsqs", "squashfs"),
+    (3, b"NTFS    ", "ntfs"),
+    (3, b"EXFAT   ", "exfat"),
+    (82, b"FAT32   ", "vfat"),
+    (54, b"FAT16   ", "vfat"),
+    (54, b"FAT12   ", "vfat"),
+    (4086, b"SWAPSPACE2", "swap"),
+    (0x8001, b"CD001", "iso9660"),
+    (0x10040, b"_BHRfS_M", "btrfs"),
+)
+
+def detect_filesystem(header):
+    """Returns the filesystem type found in the first bytes of a device, or None."""
+    for offset, magic, fstype in SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return fstype
+    if header[1080:1082] == b"\x53\xef": # ext2/3/4 superblock magic 0xEF53
+        incompat = struct.unpack_from("<I", header, 1024 + 0x60)[0]
+        compat = struct.unpack_from("<I", header, 1024 + 0x5c)[0]
+        if incompat & 0x40: # extents
+            return "ext4"
+        return "ext3" if compat & 0x4 else "ext2" # has_journal
+    return None
+
+def _read_text(path, default=""):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+def _unescape_mount_field(field):
+    # The kernel writes spaces, tabs, newlines and backslashes in mount fields as octal escapes
+    return re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), field)
+
+def read_mount_table(path="/proc/mounts"):
+    """Returns (device, mount point, filesystem type) for each line of a mounts file, in order."""
+    table = []
+    for line in _read_text(path).splitlines():
+        fields = line.split()
+        if len(fields) >= 3:
+            table.append((_unescape_mount_field(fields[0]), _unescape_mount_field(fields[1]), fields[2]))
+    return table
+
+def read_mounts(proc_root="/proc"):
+    """Returns {device path: mount point} from /proc/mounts."""
+    mounts = {}
+    for device, mount_point, _ in read_mount_table(os.path.join(proc_root, "mounts")):
+        if device.startswith("/dev/"):
+            mounts.setdefault(device, mount_point)
+    return mounts
+
+def scan(sysfs_root="/sys", proc_root="/proc", dev_root="/dev"):
+    """
+    Lists disks and partitions from /proc/partitions, with size, parent disk, removable flag
+    and model from sysfs and the filesystem type from the device's signature (None when the
+    device cannot be read, e.g. without root). Optical drives and read-only devices are left out.
+    """
+    mounts = read_mounts(proc_root)
+    devices = []
+    for line in _read_text(os.path.join(proc_root, "partitions")).splitlines()[2:]:
+        fields = line.split()
+        if len(fields) != 4 or fields[3].startswith(SKIP_PREFIXES):
+            continue
+        name = fields[3]
+        class_dir = os.path.join(sysfs_root, "class", "block", name)
+        is_partition = os.path.exists(os.path.join(class_dir, "partition"))
+        parent = None
+        disk_dir = class_dir
+        if is_partition:
+            # /sys/class/block/sda1 links into .../block/sda/sda1; the parent is the directory above
+            parent = os.path.basename(os.path.dirname(os.path.realpath(class_dir)))
+            disk_dir = os.path.join(sysfs_root, "class", "block", parent)
+        size = int(_read_text(os.path.join(class_dir, "size"), "0") or 0) * 512 # Always 512-byte sectors
+        if size == 0:
+            continue # Empty loop devices, card readers without media
+        if "1" in (_read_text(os.path.join(class_dir, "ro")), _read_text(os.path.join(disk_dir, "ro"))):
+            continue # Read-only, e.g. loop devices behind snap packages or write-protected cards
+        path = "/dev/" + name # As listed in /proc/mounts; dev_root is only where signatures are read
+        try:
+            with open(os.path.join(dev_root, name), "rb") as f:
+                fstype = detect_filesystem(f.read(SIGNATURE_BYTES))
+        except OSError:
+            fstype = None
+        devices.append(BlockDevice(
+            name=name,
+            path=path,
+            size=size,
+            is_partition=is_partition,
+            parent=parent,
+            removable=_read_text(os.path.join(disk_dir, "removable")) == "1",
+            model=_read_text(os.path.join(disk_dir, "device", "model")),
+            fstype=fstype,
+            mountpoint=mounts.get(path),
+        ))
+    return devices
+
+def device_label(device):
+    """Listbox-friendly one-liner, e.g. "/dev/sda1   ntfs    120.0 GB  /mnt/c"."""
+    size = device.size / 1024 ** 3
+    fstype = device.fstype or ("disk" if not device.is_partition else "unknown")
+    flags = " [removable]" if device.removable and not device.is_partition else ""
+    where = device.mountpoint or "not mounted"
+    return f"{device.path:<16}{fstype:<12}{size:>8.1f} GB  {where}{flags}"
+
+class BlockDeviceScanner:
+    """
+    Caches scan() results. With start_watching(), kernel uevents for the block subsystem
+    (disk plugged, partition table re-read) invalidate the cache; otherwise the cache is
+    revalidated against /proc/partitions on each call. Mounting sends no block uevent, so
+    mount points are always re-read from /proc/mounts.
+    """
+
+    def __init__(self, sysfs_root="/sys", proc_root="/proc", dev_root="/dev"):
+        self.sysfs_root = sysfs_root
+        self.proc_root = proc_root
+        self.dev_root = dev_root
+        self.lock = threading.Lock()
+        self.cache = None
+        self.partitions_text = None
+        self.watching = False
+        self._stop = threading.Event()
+
+    def devices(self):
+        with self.lock:
+            if self.cache is not None and not self.watching:
+                current = _read_text(os.path.join(self.proc_root, "partitions"))
+                if current != self.partitions_text:
+                    self.cache = None
+            if self.cache is None:
+                self.partitions_text = _read_text(os.path.join(self.proc_root, "partitions"))
+                self.cache = scan(self.sysfs_root, self.proc_root, self.dev_root)
+                return list(self.cache)
+            mounts = read_mounts(self.proc_root)
+            return [device._replace(mountpoint=mounts.get(device.path)) for device in self.cache]
+
+    def invalidate(self):
+        with self.lock:
+            self.cache = None
+
+    def start_watching(self, on_change=None):
+        """
+        Listens for block uevents on a netlink socket in a daemon thread; on_change() is
+        called from that thread after the cache is invalidated. Returns False if netlink
+        is unavailable (non-Linux, restricted container), leaving /proc revalidation on.
+        """
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, 1)) # Multicast group 1: kernel uevents
+        except (AttributeError, OSError):
+            return False
+        sock.settimeout(1.0)
+        self.watching = True
+        self._stop.clear()
+        threading.Thread(target=self._watch, args=(sock, on_change), daemon=True).start()
+        return True
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self, sock, on_change):
+        try:
+            while not self._stop.is_set():
+                try:
+                    message = sock.recv(UEVENT_BUFFER)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                # "ACTION@DEVPATH\0KEY=VALUE\0..."
+                if b"\0SUBSYSTEM=block\0" in message + b"\0":
+                    self.invalidate()
+                    if on_change:
+                        on_change()
+        finally:
+            self.watching = False
+            sock.close()
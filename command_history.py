@@ -0,0 +1,198 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# --- Configuration ---
+DEFAULT_HISTORY_PATH = os.path.join(
+    os.environ.get("XDG_STATE_HOME", os.path.join(os.path.expanduser("~"), ".local", "state")),
+    "wsl-terminal", "history.jsonl")
+MAX_ENTRIES = 200000 # Distinct commands kept; the oldest are dropped at compaction
+COMPACT_RATIO = 1.5 # Compact once the file holds this many lines per distinct command
+COMPACT_CHECK_EVERY = 1000 # Appends between compaction checks
+
+class CommandHistory:
+    """
+    Shell command history in an append-only JSON-lines file, one {"cmd", "ts"} object per
+    line. In memory each distinct command is kept once, ordered by last use, plus a sorted
+    list for prefix lookups and a trigram index for substring search, so navigation and
+    search stay fast with hundreds of thousands of entries. The index is built in the
+    background on the first search, which scans linearly until it is ready. The file is
+    rewritten without duplicates when it grows COMPACT_RATIO times larger than needed.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.recent = {} # command -> timestamp, in order of last use (oldest first)
+        self.sorted = [] # Distinct commands in lexical order, for bisect prefix ranges
+        self.trigrams = None # trigram -> [commands], built on a background thread
+        self.unindexed = None # Commands added while the index is being built
+        self.file_lines = 0
+        self.appends = 0
+        self._load()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self.file_lines > len(self.recent) * COMPACT_RATIO or len(self.recent) > self.max_entries:
+            self.compact()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    self.file_lines += 1
+                    try:
+                        entry = json.loads(line)
+                        command = entry["cmd"]
+                    except (ValueError, KeyError, TypeError):
+                        continue # A torn last line from a crash, or a hand edit
+                    self.recent.pop(command, None)
+                    self.recent[command] = entry.get("ts", 0)
+        except FileNotFoundError:
+            pass
+        self._trim()
+        self.sorted = sorted(self.recent)
+
+    def _trim(self):
+        excess = len(self.recent) - self.max_entries
+        if excess > 0:
+            for command in list(self.recent)[:excess]:
+                del self.recent[command]
+
+    def __len__(self):
+        return len(self.recent)
+
+    def add(self, command):
+        """Records a command (blank commands are ignored) and appends it to the file."""
+        if not command.strip():
+            return
+        with self.lock:
+            timestamp = time.time()
+            if self.recent.pop(command, None) is None:
+                bisect.insort(self.sorted, command)
+                if self.trigrams is not None:
+                    self._index(self.trigrams, command)
+                elif self.unindexed is not None:
+                    self.unindexed.append(command)
+            self.recent[command] = timestamp
+            self.file.write(json.dumps({"cmd": command, "ts": round(timestamp)}) + "\n")
+            self.file.flush()
+            self.file_lines += 1
+            self.appends += 1
+            if self.appends % COMPACT_CHECK_EVERY == 0 and (
+                    self.file_lines > len(self.recent) * COMPACT_RATIO or len(self.recent) > self.max_entries):
+                self._compact_locked()
+
+    def compact(self):
+        with self.lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        """Rewrites the file with one line per distinct command, oldest first."""
+        self._trim()
+        if len(self.sorted) != len(self.recent):
+            self.sorted = sorted(self.recent)
+            self.trigrams = None
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            for command, timestamp in self.recent.items():
+                f.write(json.dumps({"cmd": command, "ts": round(timestamp)}) + "\n")
+        os.replace(temp, self.path)
+        self.file_lines = len(self.recent)
+        if getattr(self, "file", None) is not None:
+            self.file.close()
+            self.file = open(self.path, "a", encoding="utf-8")
+
+    def prefix_matches(self, prefix):
+        """Distinct commands starting with prefix, most recently used first."""
+        with self.lock:
+            if not prefix:
+                return list(reversed(self.recent))
+            start = bisect.bisect_left(self.sorted, prefix)
+            end = bisect.bisect_left(self.sorted, prefix + "\U0010ffff", start)
+            matches = self.sorted[start:end]
+            return sorted(matches, key=self.recent.__getitem__, reverse=True)
+
+    @staticmethod
+    def _index(trigrams, command):
+        for trigram in {command[i:i + 3] for i in range(len(command) - 2)}:
+            trigrams.setdefault(trigram, []).append(command)
+
+    def _build_index(self):
+        """Builds the trigram index from a snapshot, without holding the lock meanwhile."""
+        with self.lock:
+            commands = list(self.recent)
+            self.unindexed = []
+        trigrams = {}
+        for command in commands:
+            self._index(trigrams, command)
+        with self.lock:
+            for command in self.unindexed:
+                self._index(trigrams, command)
+            self.trigrams = trigrams
+            self.unindexed = None
+
+    def search(self, text):
+        """Distinct commands containing text, most recently used first (Ctrl-R)."""
+        with self.lock:
+            if self.trigrams is None and self.unindexed is None:
+                # Indexing 100k commands takes about a second, so it happens off the caller's thread
+                threading.Thread(target=self._build_index, daemon=True).start()
+                self.unindexed = []
+            if len(text) < 3 or self.trigrams is None:
+                return [command for command in reversed(self.recent) if text in command]
+            postings = sorted((self.trigrams.get(text[i:i + 3], ()) for i in range(len(text) - 2)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+            matches = [command for command in candidates if text in command and command in self.recent]
+            return sorted(matches, key=self.recent.__getitem__, reverse=True)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class HistoryNavigator:
+    """
+    Walks a list of matches for Up/Down or Ctrl-R. start() remembers what was typed;
+    older() and newer() return the text to show; going newer than the newest match
+    gives back the original input.
+    """
+
+    def __init__(self):
+        self.matches = None
+        self.position = -1
+        self.original = ""
+
+    @property
+    def active(self):
+        return self.matches is not None
+
+    def start(self, matches, original):
+        self.matches = matches
+        self.position = -1
+        self.original = original
+
+    def older(self):
+        # Skip the entry identical to what was typed, so every step changes the line
+        position = self.position + 1
+        while position < len(self.matches) and self.matches[position] == self.original:
+            position += 1
+        if position < len(self.matches):
+            self.position = position
+        return self.matches[self.position] if self.position >= 0 else self.original
+
+    def newer(self):
+        position = self.position - 1
+        while position >= 0 and self.matches[position] == self.original:
+            position -= 1
+        self.position = max(-1, position)
+        return self.matches[self.position] if self.position >= 0 else self.original
+
+    def reset(self):
+        self.matches = None
+        self.position = -1
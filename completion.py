@@ -0,0 +1,171 @@
+import bisect
+import collections
+import os
+import re
+import threading
+import time
+
+# --- Configuration ---
+MAX_CACHED_DIRECTORIES = 256 # Least recently used listings are dropped beyond this
+RACY_WINDOW_NS = 1000000000 # Listings taken this soon after a change are re-read, like git's racy index entries
+MAX_LISTED = 200 # Matches shown when Tab is pressed twice on an ambiguous word
+SHELL_BUILTINS = ("alias", "bg", "cd", "exit", "export", "fg", "history", "jobs", "pwd", "source", "type", "unset")
+
+# Characters the shell would interpret; completed names escape them with a backslash
+SPECIAL = re.compile(r"([\s'\"\\$&;|()<>*?`!#{}\[\]])")
+# The word being completed: everything after the last unescaped space
+LAST_WORD = re.compile(r"(?:\\.|[^\s\\])*$")
+
+Completion = collections.namedtuple("Completion", "start text matches count")
+
+def escape(name):
+    return SPECIAL.sub(r"\\\1", name)
+
+def unescape(word):
+    return re.sub(r"\\(.)", r"\1", word)
+
+def common_prefix(first, last):
+    """Longest common prefix of a sorted range, which is that of its first and last items."""
+    length = min(len(first), len(last))
+    i = 0
+    while i < length and first[i] == last[i]:
+        i += 1
+    return first[:i]
+
+class DirectoryListing:
+    """Sorted names of one directory, plus which of them are directories."""
+
+    def __init__(self, mtime_ns, names, directories, listed_ns=0):
+        self.mtime_ns = mtime_ns
+        self.names = names
+        self.directories = directories
+        # A change within the timestamp granularity of the listing would leave mtime unchanged
+        self.racy = listed_ns - mtime_ns < RACY_WINDOW_NS
+
+    def prefix_range(self, prefix):
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + "\U0010ffff", start)
+        return start, end
+
+class DirectoryCache:
+    """
+    Directory listings cached until the directory's mtime changes, which it does whenever an
+    entry is added, removed or renamed. A cache hit costs one stat(), so completion stays fast
+    in huge or network-mounted directories; the listing itself is read on first use only.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_DIRECTORIES):
+        self.max_entries = max_entries
+        self.listings = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """The listing of path, or None if it cannot be read."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            listing = self.listings.get(path)
+            if listing is not None and listing.mtime_ns == mtime_ns and not listing.racy:
+                self.listings.move_to_end(path)
+                return listing
+        listed_ns = time.time_ns()
+        names = []
+        directories = set()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    names.append(entry.name)
+                    try:
+                        if entry.is_dir(): # Usually answered from the directory entry, without a stat
+                            directories.add(entry.name)
+                    except OSError:
+                        pass
+        except OSError:
+            return None
+        names.sort()
+        listing = DirectoryListing(mtime_ns, names, frozenset(directories), listed_ns)
+        with self.lock:
+            self.listings[path] = listing
+            self.listings.move_to_end(path)
+            while len(self.listings) > self.max_entries:
+                self.listings.popitem(last=False)
+        return listing
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.listings.clear()
+            else:
+                self.listings.pop(path, None)
+
+class Completer:
+    """
+    Tab completion for a shell command line: the first word completes against executables
+    on PATH and shell builtins, any other word (or one containing a slash) against files.
+    """
+
+    def __init__(self, cache=None, path=None):
+        self.cache = cache or DirectoryCache()
+        self.path = path # None reads $PATH on every call, so changes to it are picked up
+        self.commands = None # (key, sorted names); key is the PATH listings' mtimes
+
+    def command_names(self):
+        """Sorted executables on PATH plus builtins, rebuilt when a PATH directory changes."""
+        directories = [d for d in (self.path or os.environ.get("PATH", "")).split(os.pathsep) if d]
+        listings = [(d, self.cache.get(d)) for d in directories]
+        key = tuple((d, listing.mtime_ns if listing else None) for d, listing in listings)
+        if self.commands is None or self.commands[0] != key:
+            names = set(SHELL_BUILTINS)
+            for d, listing in listings:
+                if listing is not None:
+                    names.update(name for name in listing.names if name not in listing.directories
+                                 and os.access(os.path.join(d, name), os.X_OK))
+            self.commands = (key, sorted(names))
+        return self.commands[1]
+
+    def complete(self, line, cwd):
+        """
+        Completes the last word of line (the text before the cursor). Returns a Completion:
+        start is where the word begins in line, text what should replace it (None when
+        nothing matches), and matches the first MAX_LISTED candidate names of count in total.
+        """
+        word_match = LAST_WORD.search(line)
+        start = word_match.start()
+        word = unescape(word_match.group())
+        if not line[:start].strip() and "/" not in word:
+            return self._complete_command(start, word)
+        return self._complete_path(start, word, cwd)
+
+    def _complete_command(self, start, word):
+        names = self.command_names()
+        lo = bisect.bisect_left(names, word)
+        hi = bisect.bisect_left(names, word + "\U0010ffff", lo)
+        return self._result(start, "", names[lo:hi], ())
+
+    def _complete_path(self, start, word, cwd):
+        head, _, prefix = word.rpartition("/")
+        if "/" in word:
+            head += "/"
+        directory = os.path.expanduser(head) if head else "."
+        directory = os.path.join(cwd or os.getcwd(), directory)
+        listing = self.cache.get(os.path.normpath(directory))
+        if listing is None:
+            return Completion(start, None, [], 0)
+        lo, hi = listing.prefix_range(prefix)
+        names = listing.names[lo:hi]
+        if not prefix:
+            # Hidden names sort together, so leaving them out is a cut rather than a filter
+            hidden_lo, hidden_hi = listing.prefix_range(".")
+            names = listing.names[lo:hidden_lo] + listing.names[hidden_hi:hi]
+        return self._result(start, head, names, listing.directories)
+
+    def _result(self, start, head, names, directories):
+        if not names:
+            return Completion(start, None, [], 0)
+        if len(names) == 1:
+            # A unique match is finished off: directories get a slash, anything else a space
+            suffix = "/" if names[0] in directories else " "
+            return Completion(start, escape(head + names[0]) + suffix, names, 1)
+        return Completion(start, escape(head + common_prefix(names[0], names[-1])), names[:MAX_LISTED], len(names))
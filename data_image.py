@@ -0,0 +1,117 @@
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+
+from block_devices import read_mount_table
+
+# --- Configuration ---
+# Override with the MKFS environment variable; the image path is appended as the last argument
+MKFS = os.environ.get("MKFS", "mkfs.ext4 -F -q -L data")
+DATA_IMAGE_NAME = "data.img" # Android-x86 uses SRC/data.img as /data when no DATA= partition is given
+ZERO_CHUNK = 16 * 1024 * 1024 # Bytes per write on filesystems without sparse files
+# Filesystems where extending a file writes real zeros, so a sparse file is not instant
+NON_SPARSE_FILESYSTEMS = ("vfat", "msdos", "fat", "exfat")
+FAT32_MAX_FILE = 4 * 1024 * 1024 * 1024 - 1
+
+class DataImageError(Exception):
+    """Raised when the data image cannot be created or formatted."""
+
+def filesystem_type(path, mounts="/proc/mounts"):
+    """Type of the filesystem holding path, from the longest matching mount point (None if unknown)."""
+    path = os.path.realpath(path)
+    best, best_type = "", None
+    for _, mount_point, fstype in read_mount_table(mounts):
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) >= len(best):
+            best, best_type = mount_point, fstype
+    return best_type
+
+def allocate(path, size, progress=None, sparse=True, chunk_size=ZERO_CHUNK):
+    """
+    Creates path with size bytes of zeros. Sparse files are only a size change, which takes
+    the same time for 2 GB as for 64 GB; otherwise zeros are written chunk by chunk, calling
+    progress(done, total) after each one.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        if sparse:
+            os.ftruncate(fd, size)
+            if progress:
+                progress(size, size)
+        else:
+            zeros = bytes(chunk_size)
+            done = 0
+            while done < size:
+                count = min(chunk_size, size - done)
+                done += os.write(fd, zeros[:count] if count < chunk_size else zeros)
+                if progress:
+                    progress(done, size)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def make_filesystem(path, mkfs=MKFS):
+    """Formats the image file with the local mkfs command."""
+    command = shlex.split(mkfs) + [path]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except OSError as e:
+        raise DataImageError(f"Cannot run {command[0]}: {e}")
+    if result.returncode != 0:
+        output = (result.stderr or result.stdout).strip() or f"exit code {result.returncode}"
+        raise DataImageError(f"{command[0]} failed: {output}")
+
+def create_data_image(install_dir, size_mb, progress=None, log=print, mkfs=MKFS, name=DATA_IMAGE_NAME,
+                      replace=False):
+    """
+    Creates install_dir/data.img of size_mb MB with an ext4 filesystem. The image is sparse
+    wherever the target filesystem allows, so only the blocks Android writes take up space.
+    progress(done_bytes, total_bytes, name) is called while zeros are written (once, at the
+    end, for a sparse image). Built under a .part name and renamed once formatted.
+    An existing image holds the user's apps and settings, so it is kept unless replace is set.
+    Returns the image path.
+    """
+    size = size_mb * 1024 * 1024
+    path = os.path.join(install_dir, name)
+    partial = path + ".part"
+    if os.path.exists(path) and not replace:
+        log(f"Keeping existing {name} ({os.path.getsize(path) // (1024 * 1024)} MB)")
+        return path
+    fstype = filesystem_type(install_dir)
+    sparse = fstype not in NON_SPARSE_FILESYSTEMS
+    if fstype in ("vfat", "msdos", "fat") and size > FAT32_MAX_FILE:
+        raise DataImageError(f"{fstype} cannot hold files over 4 GB; choose a smaller /data size")
+    # The image starts out sparse, but Android will expect to be able to fill it
+    free = shutil.disk_usage(install_dir).free + (os.path.getsize(path) if os.path.exists(path) else 0)
+    if free < size:
+        raise DataImageError(f"{name} needs {size_mb} MB but only {free // (1024 * 1024)} MB is free")
+
+    def on_allocated(done, total):
+        if progress:
+            progress(done, total, name)
+
+    log(f"Creating {name} ({size_mb} MB, {'sparse' if sparse else f'zero-filled on {fstype}'})...")
+    try:
+        allocate(partial, size, on_allocated, sparse)
+        log(f"Formatting {name}...")
+        make_filesystem(partial, mkfs)
+        os.replace(partial, path)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    return path
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"Usage: {sys.argv[0]} <directory> <size in MB>")
+        sys.exit(2)
+    try:
+        print(create_data_image(sys.argv[1], int(sys.argv[2])))
+    except (OSError, DataImageError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,68 @@
+import json
+import os
+import re
+import subprocess
+
+from vm_registry import default_config_dir
+
+# --- Configuration ---
+# Override with the QEMU_IMG environment variable, e.g. a stub script for testing.
+QEMU_IMG = os.environ.get("QEMU_IMG", "qemu-img")
+DEFAULT_IMAGE_DIR = os.path.join(default_config_dir(), "images")
+DEFAULT_DISK_GB = 20
+
+class DiskImageError(Exception):
+    """Raised when qemu-img fails or is missing."""
+
+def run_qemu_img(args, binary=QEMU_IMG):
+    """Runs qemu-img and returns its stdout, raising DiskImageError with stderr on failure."""
+    try:
+        result = subprocess.run([binary] + args, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise DiskImageError(f"{binary} not found. Install QEMU or set QEMU_IMG.")
+    if result.returncode != 0:
+        raise DiskImageError(result.stderr.strip() or f"qemu-img {args[0]} failed with code {result.returncode}")
+    return result.stdout
+
+def image_path_for(vm_name, image_dir=DEFAULT_IMAGE_DIR):
+    """Default disk location for a VM, with the name made filesystem-safe."""
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", vm_name).strip("._") or "vm"
+    return os.path.join(image_dir, f"{safe}.qcow2")
+
+def create_disk(path, size_gb=DEFAULT_DISK_GB, binary=QEMU_IMG):
+    """Creates an empty, thin-provisioned qcow2 disk."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        raise DiskImageError(f"Disk image already exists: {path}")
+    run_qemu_img(["create", "-f", "qcow2", path, f"{int(size_gb)}G"], binary)
+    return path
+
+def create_linked_clone(base, path, binary=QEMU_IMG):
+    """
+    Creates a copy-on-write qcow2 overlay on top of base. The overlay only stores
+    blocks the clone writes, so it starts at a few hundred KB whatever the base size.
+    """
+    base = os.path.abspath(base)
+    if not os.path.exists(base):
+        raise DiskImageError(f"Base image not found: {base}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        raise DiskImageError(f"Disk image already exists: {path}")
+    base_format = image_info(base, binary).get("format", "qcow2")
+    run_qemu_img(["create", "-f", "qcow2", "-F", base_format, "-b", base, path], binary)
+    return path
+
+def image_info(path, binary=QEMU_IMG):
+    return json.loads(run_qemu_img(["info", "--output=json", path], binary))
+
+def backing_chain(path, binary=QEMU_IMG):
+    """Returns [path, backing, backing's backing, ...] as absolute paths."""
+    info = json.loads(run_qemu_img(["info", "--backing-chain", "--output=json", path], binary))
+    if isinstance(info, dict):
+        info = [info]
+    chain = [os.path.abspath(path)]
+    for entry in info:
+        backing = entry.get("full-backing-filename") or entry.get("backing-filename")
+        if backing:
+            chain.append(os.path.abspath(backing))
+    return chain
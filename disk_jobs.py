@@ -0,0 +1,233 @@
+import collections
+import heapq
+import itertools
+import os
+import re
+import subprocess
+import threading
+
+from disk_images import QEMU_IMG
+
+# --- Configuration ---
+# Override with the DISK_JOBS environment variable; beyond two, jobs on one disk mostly slow each other down
+MAX_CONCURRENT_JOBS = max(1, int(os.environ.get("DISK_JOBS", "2")))
+PRIORITY_HIGH = 0 # Lower runs first; equal priorities run in submission order
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+OUTPUT_LINES = 20 # Trailing qemu-img output lines kept for error messages
+READ_SIZE = 4096
+
+# qemu-img -p redraws "    (12.34/100%)" in place with carriage returns
+PROGRESS = re.compile(rb"\((\d+(?:\.\d+)?)/100%\)")
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+class DiskJob:
+    """
+    One queued operation: a qemu-img command (args) or a plain function (func).
+    output is a file the job creates; it is removed if the job fails or is cancelled.
+    on_success() runs on the worker after the command succeeds, e.g. to swap a finished
+    copy into place. kind, path and vm are for the caller's bookkeeping.
+    """
+
+    def __init__(self, job_id, description, priority, args=None, func=None, output=None, on_success=None,
+                 kind=None, path=None, vm=None):
+        self.id = job_id
+        self.description = description
+        self.priority = priority
+        self.args = args
+        self.func = func
+        self.output = output
+        self.on_success = on_success
+        self.kind = kind
+        self.path = path
+        self.vm = vm
+        self.state = JOB_QUEUED
+        self.percent = 0.0
+        self.error = None
+        self.process = None
+        self.cancelled = False
+        self.output_lines = collections.deque(maxlen=OUTPUT_LINES)
+
+    @property
+    def finished(self):
+        return self.state in (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+def convert_args(source, destination, output_format="qcow2", compress=False, backing=None, backing_format=None):
+    """qemu-img convert arguments with progress output; backing keeps the result a linked clone."""
+    args = ["convert", "-p", "-O", output_format]
+    if compress:
+        args.append("-c")
+    if backing:
+        args += ["-B", backing] + (["-F", backing_format] if backing_format else [])
+    return args + [source, destination]
+
+class DiskJobQueue:
+    """
+    Runs disk jobs on at most max_concurrent worker threads, highest priority first.
+    on_update(job) is called from a worker whenever a job changes state or its progress
+    reaches the next whole percent.
+    """
+
+    def __init__(self, on_update, max_concurrent=MAX_CONCURRENT_JOBS, binary=QEMU_IMG):
+        self.on_update = on_update
+        self.binary = binary
+        self.heap = []
+        self.all_jobs = collections.OrderedDict()
+        self.ids = itertools.count(1)
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(max(1, max_concurrent))]
+        for worker in self.workers:
+            worker.start()
+
+    def _submit(self, job):
+        with self.condition:
+            self.all_jobs[job.id] = job
+            heapq.heappush(self.heap, (job.priority, job.id, job))
+            self.condition.notify()
+        self.on_update(job)
+        return job
+
+    def submit_command(self, description, args, priority=PRIORITY_NORMAL, **details):
+        """Queues a qemu-img command; include -p in args for progress."""
+        return self._submit(DiskJob(next(self.ids), description, priority, args=args, **details))
+
+    def submit_call(self, description, func, priority=PRIORITY_NORMAL, **details):
+        return self._submit(DiskJob(next(self.ids), description, priority, func=func, **details))
+
+    def convert(self, source, destination, priority=PRIORITY_NORMAL, compress=False, output_format="qcow2", vm=None):
+        """Copies an image, flattening any backing chain (a full clone)."""
+        return self.submit_command(f"Convert {os.path.basename(source)} to {os.path.basename(destination)}",
+                                   convert_args(source, destination, output_format, compress),
+                                   priority, output=destination, kind="convert", path=destination, vm=vm)
+
+    def rewrite(self, path, priority=PRIORITY_NORMAL, compress=False, backing=None, backing_format=None,
+                kind="compact", vm=None):
+        """
+        Rewrites a qcow2 image in place through a temporary copy, which drops unused clusters
+        (compact), compresses them, or, without backing, flattens a linked clone.
+        The original is replaced only once the copy is complete. Internal snapshots are not
+        carried over to the copy, so they are lost.
+        """
+        temp = f"{path}.{kind}.part"
+
+        def swap():
+            os.replace(temp, path)
+
+        verb = {"compact": "Compact", "compress": "Compress", "flatten": "Flatten"}.get(kind, kind.title())
+        return self.submit_command(f"{verb} {os.path.basename(path)}",
+                                   convert_args(path, temp, "qcow2", compress, backing, backing_format),
+                                   priority, output=temp, on_success=swap, kind=kind, path=path, vm=vm)
+
+    def delete(self, path, priority=PRIORITY_LOW, vm=None):
+        """Removes an image; large files on some filesystems take a while to free."""
+        return self.submit_call(f"Delete {os.path.basename(path)}", lambda: os.remove(path), priority,
+                                kind="delete", path=path, vm=vm)
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job. Returns False if it had already finished."""
+        with self.condition:
+            job = self.all_jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancelled = True
+            if job.state == JOB_QUEUED:
+                job.state = JOB_CANCELLED # Skipped when a worker pops it
+            elif job.process is not None:
+                job.process.terminate()
+        if job.state == JOB_CANCELLED:
+            self.on_update(job)
+        return True
+
+    def jobs(self):
+        with self.condition:
+            return list(self.all_jobs.values())
+
+    def clear_finished(self):
+        with self.condition:
+            for job_id in [job.id for job in self.all_jobs.values() if job.finished]:
+                del self.all_jobs[job_id]
+
+    def shutdown(self):
+        """Cancels everything and stops the workers (without waiting for them)."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        for job in self.jobs():
+            self.cancel(job.id)
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.heap and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                _, _, job = heapq.heappop(self.heap)
+                if job.cancelled:
+                    continue
+                job.state = JOB_RUNNING
+            self.on_update(job)
+            try:
+                if job.args is not None:
+                    self._run_command(job)
+                else:
+                    job.func()
+                if job.cancelled:
+                    job.state = JOB_CANCELLED
+                else:
+                    if job.on_success:
+                        job.on_success()
+                    job.percent = 100.0
+                    job.state = JOB_DONE
+            except Exception as e:
+                job.state = JOB_CANCELLED if job.cancelled else JOB_FAILED
+                job.error = str(e)
+            if job.state != JOB_DONE and job.output:
+                try:
+                    os.remove(job.output)
+                except OSError:
+                    pass
+            self.on_update(job)
+
+    def _run_command(self, job):
+        with self.condition:
+            if job.cancelled:
+                return
+            try:
+                job.process = subprocess.Popen([self.binary] + job.args, stdin=subprocess.DEVNULL,
+                                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+            except FileNotFoundError:
+                raise RuntimeError(f"{self.binary} not found. Install QEMU or set QEMU_IMG.")
+        pending = b""
+        fd = job.process.stdout.fileno()
+        while True:
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                break
+            *pieces, pending = re.split(rb"[\r\n]", pending + data)
+            for piece in pieces:
+                self._handle_output(job, piece)
+        self._handle_output(job, pending)
+        job.process.stdout.close()
+        code = job.process.wait()
+        if code != 0 and not job.cancelled:
+            raise RuntimeError("\n".join(job.output_lines) or f"qemu-img {job.args[0]} failed with code {code}")
+
+    def _handle_output(self, job, piece):
+        match = PROGRESS.search(piece)
+        if match:
+            percent = float(match.group(1))
+            if int(percent) != int(job.percent):
+                job.percent = percent
+                self.on_update(job)
+            else:
+                job.percent = percent
+        elif piece.strip():
+            job.output_lines.append(piece.decode("utf-8", errors="replace").strip())
@@ -1,42 +1,70 @@
 import tkinter as tk
 from tkinter import scrolledtext
-import random
-import time
-import threading
-import datetime
+import tkinter.font as tkfont
+
+from ansi_parser import AnsiParser, tag_options
+from command_history import CommandHistory, HistoryNavigator
+from completion import Completer
+from pty_session import PtySession
+from tk_console import BatchedConsole
+from ui_events import UiEvents
+
+TERMINAL_SCROLLBACK = 10000 # Lines kept; older output is trimmed in chunks
 
 class WslTerminalApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Ubuntu - WSL Terminal")
         self.root.geometry("800x500")
-        
+
         # Configure the window to look like a terminal
         self.root.configure(bg="#0c0c0c")
-        
-        self.username = "user"
-        self.hostname = "DESKTOP-LINUX"
-        self.current_dir = "~"
-        
+
         self.create_widgets()
-        
-        # Simulate WSL startup sequence in a thread
-        threading.Thread(target=self.simulate_startup, daemon=True).start()
+        # Output from the reader thread is buffered and inserted at most once per tick,
+        # above the "input" mark so it never lands inside what the user is typing
+        self.events = UiEvents(root)
+        self.output = BatchedConsole(self.console, max_lines=TERMINAL_SCROLLBACK, events=self.events, index="input")
+        # Colours and attributes from escape sequences become a bounded set of reused tags
+        self.ansi = AnsiParser()
+        self.ansi_tags = set() # Only touched by the reader thread
+
+        # Persistent history; Up/Down walk commands starting with what is typed, Ctrl-R searches
+        try:
+            self.history = CommandHistory()
+        except OSError as e:
+            self.history = None
+            self.print_output(f"Command history disabled: {e}", "error")
+        self.navigator = HistoryNavigator()
+        # Tab completes commands and paths from cached directory listings, relative to the shell's cwd
+        self.completer = Completer()
+        self.tab_again = False # A Tab that changed nothing; a second one lists the matches
+
+        # A real shell on a pseudo-terminal; its prompt and echo arrive as ordinary output
+        self.session = PtySession(on_output=self.on_shell_output,
+                                  on_exit=lambda code: self.events.call(self.on_shell_exit, code))
+        try:
+            self.session.start()
+        except OSError as e:
+            self.print_output(f"Could not start {self.session.shell}: {e}", "error")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_widgets(self):
         # Main Console Output Area
         self.console = scrolledtext.ScrolledText(
-            self.root, 
-            bg="#0c0c0c", 
-            fg="#cccccc", 
-            font=("Consolas", 11), 
+            self.root,
+            bg="#0c0c0c",
+            fg="#cccccc",
+            font=("Consolas", 11),
             insertbackground="#ffffff",
             state='normal',
             wrap=tk.WORD,
             padx=10, pady=10
         )
         self.console.pack(fill=tk.BOTH, expand=True)
-        
+        # Measured on resize to work out the terminal size; created once, resizes come in bursts
+        self.console_font = tkfont.Font(font=self.console.cget("font"))
+
         # Color Tags for styling
         self.console.tag_config("prompt", foreground="#2aa198") # Cyan for user@host
         self.console.tag_config("path", foreground="#859900")   # Green for directory
@@ -44,190 +72,198 @@ class WslTerminalApp:
         self.console.tag_config("success", foreground="#268bd2")# Blue for success messages
         self.console.tag_config("error", foreground="#dc322f")  # Red for errors
         self.console.tag_config("output", foreground="#b58900") # Yellow for file lists
-        
+
         # Bind keys
         self.console.bind("<Return>", self.handle_enter)
         self.console.bind("<BackSpace>", self.handle_backspace)
         self.console.bind("<Key>", self.handle_key_press)
-        
-        self.input_start_index = "1.0"
-        self.disable_editing()
-
-    def simulate_startup(self):
-        """Simulates the WSL initialization process."""
-        time.sleep(0.5)
-        self.print_output("Installing, this may take a few minutes...", "output")
-        time.sleep(1.0)
-        self.print_output("Welcome to Ubuntu 22.04.2 LTS (GNU/Linux 5.15.0-76-generic x86_64)", "output")
-        time.sleep(0.2)
-        self.print_output(" * Documentation:  https://help.ubuntu.com", "output")
-        self.print_output(" * Management:     https://landscape.canonical.com", "output")
-        self.print_output(" * Support:        https://ubuntu.com/advantage", "output")
-        time.sleep(0.5)
-        self.print_output("", "output")
-        
-        # Show new message
-        self.print_output("0 updates can be applied immediately.", "output")
-        self.print_output("", "output")
-        
-        self.show_prompt()
+        self.console.bind("<Control-c>", self.handle_interrupt)
+        self.console.bind("<Control-d>", self.handle_eof)
+        self.console.bind("<Up>", self.handle_history_older)
+        self.console.bind("<Down>", self.handle_history_newer)
+        self.console.bind("<Control-r>", self.handle_history_search)
+        self.console.bind("<Tab>", self.handle_tab)
+        self.console.bind("<<Paste>>", self.handle_paste)
+        self.console.bind("<Configure>", self.handle_resize)
+
+        # Output is inserted at the "input" mark; what the user types sits after it until Enter.
+        # Right gravity keeps the mark after each insert, so output never lands inside typed text.
+        self.console.mark_set("input", "end-1c")
+        self.console.mark_gravity("input", tk.RIGHT)
+        self.console.focus_set()
 
     def print_output(self, text, tag="output"):
         """Thread-safe print to console."""
-        self.console.config(state='normal')
-        self.console.insert(tk.END, text + "\n", tag)
-        self.console.see(tk.END)
-        self.console.config(state='disabled')
-
-    def show_prompt(self):
-        """Displays the user@hostname:directory$ prompt."""
-        self.console.config(state='normal')
-        
-        # Construct prompt: user@hostname:~$         prompt_text = f"{self.username}@{self.hostname}:{self.current_dir}$ "
-        
-        self.console.insert(tk.END, prompt_text, "prompt")
-        
-        # Mark where the user starts typing
-        self.input_start_index = self.console.index("end-1c")
-        self.console.config(state='disabled')
-        
-        # Ensure cursor is at the end
-        self.console.mark_set(tk.INSERT, tk.END)
-
-    def enable_editing(self):
-        self.console.config(state='normal')
-
-    def disable_editing(self):
-        self.console.config(state='disabled')
+        self.output.write(text + "\n", tag)
+
+    def on_shell_output(self, text):
+        """Called from the session's reader thread; parsing happens here, off the Tk thread."""
+        for segment, tags in self.ansi.feed(text):
+            for tag in tags:
+                if tag not in self.ansi_tags:
+                    # Tag options apply to every range carrying the tag, so configuring it late is fine
+                    self.ansi_tags.add(tag)
+                    self.events.call(self.configure_ansi_tag, tag)
+            self.output.write(segment, tags)
+
+    def configure_ansi_tag(self, tag):
+        self.console.tag_config(tag, **tag_options(tag, font=("Consolas", 11),
+                                                   foreground=self.console.cget("fg"),
+                                                   background=self.console.cget("bg")))
+
+    def typed_text(self):
+        return self.console.get("input", "end-1c")
+
+    def insert_typed(self, text):
+        """Inserts at the cursor, keeping the "input" mark in front of the typed text."""
+        # The mark's right gravity would otherwise carry it past text typed right at the mark
+        start = self.console.index(tk.INSERT)
+        at_mark = self.console.compare(tk.INSERT, "==", "input")
+        self.console.insert(tk.INSERT, text)
+        if at_mark:
+            self.console.mark_set("input", start)
+        self.console.see(tk.INSERT)
+
+    def replace_typed(self, text):
+        self.console.delete("input", "end-1c")
+        self.console.mark_set(tk.INSERT, "input")
+        self.insert_typed(text)
 
     def handle_key_press(self, event):
-        """Restrict typing to only after the prompt."""
-        cursor_index = self.console.index(tk.INSERT)
-        
-        # Compare indices to see if cursor is before the input start
-        # We do a simple check: is the line number same? if so, check char position
-        # A robust way involves comparing the actual string indices
-        
-        current_line = int(cursor_index.split('.')[0])
-        start_line = int(self.input_start_index.split('.')[0])
-        
-        if current_line < start_line:
-            return "break" # Block typing
-            
-        if current_line == start_line:
-            current_col = int(cursor_index.split('.')[1])
-            start_col = int(self.input_start_index.split('.')[1])
-            if current_col < start_col:
+        """Restrict typing to the input area after the last output."""
+        if event.char:
+            self.navigator.reset()
+            self.tab_again = False
+        printable = event.char and event.char.isprintable()
+        if self.console.compare(tk.INSERT, "<", "input"):
+            if printable:
+                # Typing while scrolled into old output continues the input line
+                self.console.mark_set(tk.INSERT, "end-1c")
+                self.insert_typed(event.char)
                 return "break"
+            if event.keysym not in ("Left", "Right", "Up", "Down", "Prior", "Next", "Home", "End"):
+                return "break"
+        elif printable and not self.console.tag_ranges(tk.SEL):
+            self.insert_typed(event.char)
+            return "break"
+
+    def handle_paste(self, event):
+        try:
+            text = self.console.clipboard_get()
+        except tk.TclError:
+            return "break"
+        if self.console.compare(tk.INSERT, "<", "input"):
+            self.console.mark_set(tk.INSERT, "end-1c")
+        self.insert_typed(text)
+        return "break"
+
+    def handle_tab(self, event):
+        """Completes the word before the cursor; pressing Tab twice lists ambiguous matches."""
+        if self.console.compare(tk.INSERT, "<", "input"):
+            self.console.mark_set(tk.INSERT, "end-1c")
+        line = self.console.get("input", tk.INSERT)
+        completion = self.completer.complete(line, self.session.current_directory() or self.session.cwd)
+        if completion.text is None:
+            self.console.bell()
+        elif completion.text != line[completion.start:]:
+            self.console.delete(f"input + {completion.start} chars", tk.INSERT)
+            self.insert_typed(completion.text)
+            self.tab_again = False
+        elif self.tab_again:
+            listed = "  ".join(completion.matches)
+            if completion.count > len(completion.matches):
+                listed += f"  ... ({completion.count - len(completion.matches)} more)"
+            # Like bash, list below the prompt line and then repeat the prompt
+            self.output.write("\n" + listed + "\n", "output")
+            self.output.write(self.console.get("input linestart", "input"))
+        else:
+            self.tab_again = True
+            self.console.bell()
+        return "break"
+
+    def handle_history_older(self, event):
+        """Up: the previous command starting with what was typed before navigation began."""
+        if self.history is None or self.console.compare(tk.INSERT, "<", "input"):
+            return None # Plain cursor movement while reading old output
+        if not self.navigator.active:
+            typed = self.typed_text()
+            self.navigator.start(self.history.prefix_matches(typed), typed)
+        self.replace_typed(self.navigator.older())
+        return "break"
+
+    def handle_history_newer(self, event):
+        if self.console.compare(tk.INSERT, "<", "input"):
+            return None
+        if self.navigator.active:
+            self.replace_typed(self.navigator.newer())
+        return "break"
+
+    def handle_history_search(self, event):
+        """Ctrl-R: the most recent command containing the typed text; repeat for older ones."""
+        if self.history is None:
+            return "break"
+        if not self.navigator.active:
+            typed = self.typed_text()
+            self.navigator.start(self.history.search(typed), typed)
+        self.replace_typed(self.navigator.older())
+        return "break"
 
     def handle_backspace(self, event):
-        """Prevent deleting the prompt."""
-        cursor_index = self.console.index(tk.INSERT)
-        if self.console.compare(cursor_index, "<=", self.input_start_index):
+        """Prevent deleting shell output."""
+        self.navigator.reset()
+        if self.console.tag_ranges(tk.SEL):
+            if self.console.compare(tk.SEL_FIRST, "<", "input"):
+                return "break"
+        elif self.console.compare(tk.INSERT, "<=", "input"):
             return "break"
 
     def handle_enter(self, event):
-        """Process the command entered by the user."""
-        # Get the text typed by the user
-        self.console.config(state='normal')
-        end_index = self.console.index("end-1c")
-        
-        # Extract command text between input_start and end
-        cmd_range = f"{self.input_start_index}+1c"
-        # Handle empty line case
-        try:
-            command = self.console.get(self.input_start_index, end_index).strip()
-        except:
-            command = ""
-            
-        self.console.insert(tk.END, "\n") # Move to new line
-        self.console.config(state='disabled')
-        
-        if command:
-            self.process_command(command)
-            
-        # Show next prompt
-        self.root.after(100, self.show_prompt)
+        """Sends the typed line to the shell; the terminal echoes it back as output."""
+        command = self.typed_text()
+        self.console.delete("input", "end-1c")
+        self.navigator.reset()
+        if self.session.is_alive():
+            # Checked before sending: input to sudo, ssh or a running program is not history
+            record = self.history is not None and self.session.at_prompt()
+            self.session.write(command + "\n")
+            if record:
+                self.history.add(command)
         return "break"
 
-    def process_command(self, cmd):
-        """Simulate Linux commands."""
-        parts = cmd.split()
-        cmd_name = parts[0].lower()
-        args = parts[1:]
-
-        if cmd_name == "clear":
-            self.console.config(state='normal')
-            self.console.delete(1.0, tk.END)
-            self.console.config(state='disabled')
-            
-        elif cmd_name == "ls":
-            files = ["Documents", "Downloads", "script.py", "main.cpp", "test.txt", "workflow.yml"]
-            self.print_output("  ".join(files), "output")
-            
-        elif cmd_name == "pwd":
-            self.print_output(f"/home/{self.username}", "output")
-            
-        elif cmd_name == "whoami":
-            self.print_output(self.username, "output")
-            
-        elif cmd_name == "date":
-            now = datetime.datetime.now().strftime("%a %b %d %H:%M:%S %Z %Y")
-            self.print_output(now, "output")
-            
-        elif cmd_name == "echo":
-            self.print_output(" ".join(args), "output")
-            
-        elif cmd_name == "python3" or cmd_name == "python":
-            if not args:
-                self.start_python_interpreter()
-            else:
-                self.run_python_script(args[0])
-                
-        elif cmd_name == "exit":
-            self.print_output("logout", "output")
-            self.root.after(1000, self.root.destroy)
-            
-        else:
-            self.print_output(f"bash: {cmd_name}: command not found", "error")
-
-    def run_python_script(self, script_name):
-        """Simulate running a python script file."""
-        self.print_output(f"Running {script_name}...", "success")
-        time.sleep(0.2)
-        
-        if "loop" in script_name or "heavy" in script_name:
-            # Simulate a long running script
-            for i in range(1, 6):
-                time.sleep(0.3)
-                self.print_output(f"Processing item {i}/5...", "output")
-            self.print_output("Done.", "success")
-        else:
-            # Standard hello world or math
-            outputs = [
-                "Hello, World!",
-                "Calculation result: 42",
-                "Script executed successfully.",
-                f"Random Number: {random.randint(1, 100)}"
-            ]
-            self.print_output(random.choice(outputs), "output")
-            self.print_output(f"[Process completed]", "success")
-
-    def start_python_interpreter(self):
-        """Simulate entering the Python REPL."""
-        self.print_output("Python 3.10.6 (main, Nov 14 2022, 16:30:00) [GCC 11.3.0] on linux", "output")
-        self.print_output('Type "help", "copyright", "credits" or "license" for more information.', "output")
-        self.print_output(">>> ", "command")
-        
-        # In a real simulation, we would change the input handling here.
-        # For this simple script, we will just print a sample interaction and exit back to shell.
-        time.sleep(0.5)
-        self.print_output("print('WSL is working!')", "command")
-        time.sleep(0.2)
-        self.print_output("WSL is working!", "output")
-        time.sleep(0.2)
-        self.print_output(">>> exit()", "command")
-        self.print_output("")
+    def handle_interrupt(self, event):
+        """Ctrl-C copies a selection, otherwise it interrupts the foreground program."""
+        if self.console.tag_ranges(tk.SEL):
+            return None
+        self.console.delete("input", "end-1c")
+        self.navigator.reset()
+        if self.session.is_alive():
+            self.session.interrupt()
+        return "break"
+
+    def handle_eof(self, event):
+        if not self.typed_text() and self.session.is_alive():
+            self.session.send_eof()
+        return "break"
+
+    def handle_resize(self, event):
+        """Tells the terminal how many rows and columns fit, so programs wrap and page correctly."""
+        if event.widget is not self.console:
+            return
+        cols = max(20, (event.width - 20) // max(1, self.console_font.measure("0")))
+        rows = max(5, (event.height - 20) // max(1, self.console_font.metrics("linespace")))
+        if (rows, cols) != (self.session.rows, self.session.cols) and self.session.is_alive():
+            self.session.resize(rows, cols)
+
+    def on_shell_exit(self, code):
+        self.print_output(f"[Process exited with code {code}]", "success")
+        self.root.after(1000, self.root.destroy)
+
+    def on_close(self):
+        self.session.close()
+        if self.history is not None:
+            self.history.close()
+        self.events.stop()
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
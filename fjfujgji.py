@@ -1,35 +1,92 @@
 import qrcode
 import random
 import os
+import io
 
-def generate_random_qr_code(filename="random_qrcode.png"):
-    """
-    Generates a QR code with a random data string and saves it as a PNG file.
-    """
+# --- QR Configuration ---
+# Shared by single-code generation and the batch pipeline (qr_batch.py).
+QR_SETTINGS = {
+    "version": 1, # Controls the size; None makes it automatic
+    "error_correction": qrcode.constants.ERROR_CORRECT_L, # Less than 7% errors can be corrected
+    "box_size": 10, # How many pixels each "box" of the QR code is
+    "border": 4, # How many boxes thick the border should be
+}
+
+def random_payload():
+    """Returns the random URL encoded by default."""
     # Generate a random integer between 10000 and 99999
     random_id = random.randint(10000, 99999)
-    # Create the data string to encode
-    data = f"https://yourwebsite.com{random_id}"
+    return f"https://yourwebsite.com{random_id}"
+
+def render_qr_code(data, output, backend="pil", cache=None, **settings):
+    """
+    Encodes data and writes the PNG image to output (a path or a binary file object).
+    backend is "pil" (qrcode's image factory) or "numpy" (vectorized rasterizer in qr_raster.py);
+    both produce the same pixels. Keyword arguments override QR_SETTINGS.
+    With a qr_cache.QrCache, a previously rendered identical code is reused instead.
+    Returns True when the image came from the cache.
+    """
+    settings = {**QR_SETTINGS, **settings}
+    if cache is not None:
+        key = cache.key(data, settings)
+        if cache.fetch(key, output):
+            return True
+        if hasattr(output, "write"):
+            buffer = io.BytesIO()
+            _render(data, buffer, backend, settings)
+            png = buffer.getvalue()
+            output.write(png)
+        else:
+            _render(data, output, backend, settings)
+            png = output
+        cache.store(key, png)
+        return False
+
+    _render(data, output, backend, settings)
+    return False
 
+def _render(data, output, backend, settings):
     # Create a QRCode object
-    qr = qrcode.QRCode(
-        version=1, # Controls the size; None makes it automatic
-        error_correction=qrcode.constants.ERROR_CORRECT_L, # Less than 7% errors can be corrected
-        box_size=10, # How many pixels each "box" of the QR code is
-        border=4, # How many boxes thick the border should be
-    )
-    
+    qr = qrcode.QRCode(**settings)
+
     # Add the data to the QR code
     qr.add_data(data)
     qr.make(fit=True) # Adjusts size automatically to fit the data
 
+    if backend == "numpy":
+        # Imported lazily so the default backend does not need numpy
+        import qr_raster
+        qr_raster.save_png(qr, output)
+        return
+    if backend != "pil":
+        raise ValueError(f"Unknown QR image backend: {backend}")
+
     # Create the QR code image
     img = qr.make_image(fill_color="black", back_color="white")
-    
+
     # Save the image file
-    img.save(filename)
-    print(f"QR Code generated for data: {data}")
-    print(f"QR Code saved as {os.path.abspath(filename)}")
+    img.save(output, format="PNG")
+
+def generate_random_qr_code(filename="random_qrcode.png", data=None, quiet=False, backend="pil",
+                            cache=None, **settings):
+    """
+    Generates a QR code with a random data string and saves it as a PNG file.
+    Pass data to encode a specific payload instead of a random one,
+    backend="numpy" to render with the vectorized rasterizer and
+    cache=qr_cache.QrCache() to reuse previously rendered codes.
+    """
+    # Create the data string to encode
+    if data is None:
+        data = random_payload()
+
+    cached = render_qr_code(data, filename, backend=backend, cache=cache, **settings)
+    if not quiet:
+        print(f"QR Code {'reused from cache' if cached else 'generated'} for data: {data}")
+        print(f"QR Code saved as {os.path.abspath(filename)}")
+        if cache is not None:
+            stats = cache.stats()
+            print(f"Cache: {stats['hits']} hits, {stats['misses']} misses")
+    return data
 
 if __name__ == "__main__":
     generate_random_qr_code()
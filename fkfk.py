@@ -1,34 +1,166 @@
 import subprocess
+import threading
 import time
 import os
+import sys
 
 # --- Configuration ---
-# If scrcpy is in your system's PATH, just use "scrcpy".
+# If scrcpy and adb are in your system's PATH, just use "scrcpy" and "adb".
 # Otherwise, provide the full path to the executable, e.g., r"C:\path\to\scrcpy\scrcpy.exe"
-SCRCPY_EXECUTABLE = "scrcpy" 
+# The SCRCPY and ADB environment variables override these (e.g. with stub scripts for testing).
+SCRCPY_EXECUTABLE = os.environ.get("SCRCPY", "scrcpy")
+ADB_EXECUTABLE = os.environ.get("ADB", "adb")
+POLL_SECONDS = 2.0 # How often the device list is refreshed
+BACKOFF_INITIAL_SECONDS = 1.0 # Delay before the first restart of a crashed session; doubles per crash
+BACKOFF_MAX_SECONDS = 60.0
+STABLE_SECONDS = 30.0 # A session that ran this long resets its backoff
+STOP_TIMEOUT_SECONDS = 5.0 # Time allowed after terminate before sessions are killed
 
-def run_scrcpy_usb():
-    print(f"Attempting to launch {SCRCPY_EXECUTABLE} for USB connected device...")
-    print("Ensure your Android device is connected via USB and USB debugging is enabled.")
-    
+def list_devices(adb=ADB_EXECUTABLE):
+    """
+    Parses `adb devices -l` into {serial: (state, details)}, where state is e.g. "device",
+    "unauthorized" or "offline" and details holds fields like model and transport_id.
+    Raises FileNotFoundError if adb is missing; returns {} if adb fails.
+    """
+    result = subprocess.run([adb, "devices", "-l"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return {}
+    devices = {}
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        # Skip the header, blank lines and daemon start-up chatter ("* daemon started successfully")
+        if len(fields) < 2 or line.startswith(("List of devices", "*")):
+            continue
+        details = dict(field.split(":", 1) for field in fields[2:] if ":" in field)
+        devices[fields[0]] = (fields[1], details)
+    return devices
+
+class ScrcpySession:
+    """One device's scrcpy process, with its restart bookkeeping."""
+
+    def __init__(self, serial, title):
+        self.serial = serial
+        self.title = title
+        self.process = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.next_start = 0.0
+        self.closed_by_user = False
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+class ScrcpySupervisor:
+    """
+    Keeps one scrcpy window open per connected device. Sessions that crash are restarted after
+    an exponentially growing delay; a window the user closes stays closed until the device is
+    reconnected. Extra arguments are passed to every scrcpy.
+    """
+
+    def __init__(self, scrcpy=SCRCPY_EXECUTABLE, adb=ADB_EXECUTABLE, extra_args=()):
+        self.scrcpy = scrcpy
+        self.adb = adb
+        self.extra_args = list(extra_args)
+        self.sessions = {}
+        self.waiting = set() # Serials listed as unauthorized or offline, reported once
+
+    def _start(self, session):
+        command = [self.scrcpy, "--serial", session.serial, "--window-title", session.title] + self.extra_args
+        # Own process group, so Ctrl+C reaches only the supervisor, which then stops sessions in order
+        if os.name == "nt":
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {"start_new_session": True}
+        session.process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT, **group)
+        session.started_at = time.monotonic()
+        print(f"[{session.serial}] Started {self.scrcpy} (pid {session.process.pid}) for {session.title}")
+        threading.Thread(target=self._relay_output, args=(session.serial, session.process.stdout),
+                         daemon=True).start()
+
+    @staticmethod
+    def _relay_output(serial, stream):
+        for raw in iter(stream.readline, b""):
+            print(f"[{serial}] {raw.decode('utf-8', errors='replace').rstrip()}")
+        stream.close()
+
+    def _reap(self, session, now):
+        """Handles a session whose process has exited."""
+        code = session.process.returncode
+        session.process = None
+        if code == 0:
+            session.closed_by_user = True
+            print(f"[{session.serial}] Window closed; it reopens when the device is reconnected.")
+            return
+        if now - session.started_at >= STABLE_SECONDS:
+            session.failures = 0
+        session.failures += 1
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_INITIAL_SECONDS * 2 ** (session.failures - 1))
+        session.next_start = now + delay
+        print(f"[{session.serial}] scrcpy exited with code {code}; restarting in {delay:g}s.")
+
+    def poll(self):
+        """One supervision pass: reaps exited sessions, starts new and due ones, forgets unplugged devices."""
+        now = time.monotonic()
+        devices = list_devices(self.adb)
+        for session in self.sessions.values():
+            if session.process is not None and session.process.poll() is not None:
+                self._reap(session, now)
+        for serial in list(self.sessions):
+            if serial not in devices and not self.sessions[serial].is_running():
+                print(f"[{serial}] Device disconnected.")
+                del self.sessions[serial]
+        for serial, (state, details) in devices.items():
+            if state != "device":
+                if serial not in self.waiting:
+                    print(f"[{serial}] Device is {state}; accept the USB debugging prompt on the device.")
+                    self.waiting.add(serial)
+                continue
+            self.waiting.discard(serial)
+            session = self.sessions.get(serial)
+            if session is None:
+                title = f"{details.get('model', 'Android').replace('_', ' ')} ({serial})"
+                self.sessions[serial] = session = ScrcpySession(serial, title)
+            if session.process is None and not session.closed_by_user and now >= session.next_start:
+                self._start(session)
+        self.waiting &= set(devices)
+
+    def stop_all(self, timeout=STOP_TIMEOUT_SECONDS):
+        """Terminates every session, killing any that are still running after timeout."""
+        running = [session for session in self.sessions.values() if session.is_running()]
+        for session in running:
+            session.process.terminate()
+        deadline = time.monotonic() + timeout
+        for session in running:
+            try:
+                session.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                session.process.kill()
+                session.process.wait()
+            print(f"[{session.serial}] Stopped.")
+
+    def run(self, poll_seconds=POLL_SECONDS):
+        """Supervises until Ctrl+C, then shuts every session down."""
+        try:
+            while True:
+                self.poll()
+                time.sleep(poll_seconds)
+        finally:
+            self.stop_all()
+
+def run_scrcpy_usb(extra_args=()):
+    print(f"Watching for Android devices with {ADB_EXECUTABLE}; one {SCRCPY_EXECUTABLE} window per device.")
+    print("Ensure your Android devices are connected via USB and USB debugging is enabled.")
+    print("Press Ctrl+C in this Python console to stop mirroring.")
+    supervisor = ScrcpySupervisor(extra_args=extra_args)
     try:
-        # Launch scrcpy process. It will automatically detect a single connected USB device.
-        # The process will run in the background until the script is terminated or the scrcpy window is closed.
-        process = subprocess.Popen([SCRCPY_EXECUTABLE])
-        print("Scrcpy running. Press Ctrl+C in this Python console to stop mirroring.")
-        
-        # Keep the script alive while scrcpy runs
-        process.wait() 
-        
-    except FileNotFoundError:
-        print(f"Error: {SCRCPY_EXECUTABLE} not found.")
-        print("Please check your SCRCPY_EXECUTABLE path or ensure it is added to your system's PATH environment variables.")
+        supervisor.run()
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found.")
+        print("Please check SCRCPY_EXECUTABLE / ADB_EXECUTABLE or ensure they are added to your system's PATH environment variables.")
     except KeyboardInterrupt:
-        print("Scrcpy process terminated by user (Ctrl+C).")
-        if process and process.poll() is None:
-            process.terminate()
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        print("Scrcpy sessions terminated by user (Ctrl+C).")
 
 if __name__ == "__main__":
-    run_scrcpy_usb()
+    # Any arguments are passed on to scrcpy, e.g. --max-size 1024
+    run_scrcpy_usb(sys.argv[1:])
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from vm_registry import default_config_dir
+
+# --- Configuration ---
+CHUNK_SIZE = 8 * 1024 * 1024 # Bytes hashed per step; hashlib releases the GIL on large buffers
+HASH_THREADS = min(4, os.cpu_count() or 1)
+DEFAULT_ALGORITHM = "sha256"
+DEFAULT_CATALOG_PATH = os.path.join(default_config_dir(), "iso_catalog.json")
+
+# Checksum files looked for next to an image, "{name}" is the image's file name
+CHECKSUM_FILES = ("{name}.sha256", "{name}.sha256sum", "{name}.sha512", "{name}.sha1", "{name}.md5",
+                  "SHA256SUMS", "sha256sum.txt", "SHA512SUMS", "SHA1SUMS", "MD5SUMS", "md5sum.txt")
+DIGEST_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+# Verification results
+STATUS_VERIFIED = "verified"
+STATUS_MISMATCH = "mismatch"
+STATUS_UNVERIFIED = "unverified" # No checksum file lists the image
+
+def hash_file(path, algorithms=(DEFAULT_ALGORITHM,), progress=None, chunk_size=CHUNK_SIZE):
+    """
+    Hashes a file through a read-only memory map and returns {algorithm: hexdigest}.
+    A single digest is inherently sequential, so when several algorithms are needed each
+    runs on its own thread over the same chunk. progress(done_bytes, total_bytes) is called
+    after every chunk from the calling thread.
+    """
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    size = os.path.getsize(path)
+    if size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                ThreadPoolExecutor(max_workers=min(len(hashers), HASH_THREADS)) as pool:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, chunk_size):
+                    with view[offset:offset + chunk_size] as chunk:
+                        if len(hashers) == 1:
+                            next(iter(hashers.values())).update(chunk)
+                        else:
+                            list(pool.map(lambda hasher: hasher.update(chunk), hashers.values()))
+                    if progress:
+                        progress(min(offset + chunk_size, size), size)
+            finally:
+                view.release()
+    elif progress:
+        progress(0, 0)
+    return {name: hasher.hexdigest() for name, hasher in hashers.items()}
+
+def parse_checksum_lines(lines):
+    """
+    Parses GNU ("<hex>  [*]name") and BSD ("SHA256 (name) = <hex>") checksum lines.
+    Returns {file name: (algorithm, hexdigest)}; unknown lines are skipped.
+    """
+    expected = {}
+    for line in lines:
+        line = line.strip()
+        bsd = re.match(r"^(\w+) \((.+)\) = ([0-9a-fA-F]+)$", line)
+        if bsd:
+            algorithm, name, digest = bsd.group(1).lower().replace("-", ""), bsd.group(2), bsd.group(3)
+        else:
+            gnu = re.match(r"^([0-9a-fA-F]+) [ *]?(.+)$", line)
+            if not gnu:
+                continue
+            digest, name = gnu.groups()
+            algorithm = DIGEST_LENGTHS.get(len(digest))
+        if algorithm in hashlib.algorithms_available:
+            expected[os.path.basename(name.strip())] = (algorithm, digest.lower())
+    return expected
+
+def parse_checksum_file(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return parse_checksum_lines(f)
+
+def find_checksum(image_path):
+    """Returns (checksum file, algorithm, hexdigest) for an image, or None if no file lists it."""
+    folder, name = os.path.split(os.path.abspath(image_path))
+    for pattern in CHECKSUM_FILES:
+        candidate = os.path.join(folder, pattern.format(name=name))
+        if not os.path.isfile(candidate):
+            continue
+        try:
+            entries = parse_checksum_file(candidate)
+        except OSError:
+            continue
+        if name in entries:
+            return (candidate, *entries[name])
+        if len(entries) == 1 and pattern.startswith("{name}"):
+            # Per-image files often list the original download name
+            return (candidate, *next(iter(entries.values())))
+    return None
+
+class IsoCatalog:
+    """
+    JSON catalog of hashed images keyed on (path, size, mtime_ns), so an unchanged image
+    is only hashed once. Safe to call from any thread.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(temp, self.path)
+
+    def lookup(self, image_path):
+        """Returns the cached entry if the image is unchanged since it was hashed, else None."""
+        image_path = os.path.abspath(image_path)
+        st = os.stat(image_path)
+        with self.lock:
+            entry = self._load().get(image_path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry
+        return None
+
+    def check(self, image_path, progress=None):
+        """
+        Hashes and verifies an image unless the catalog already has it.
+        Returns an entry dict with path, size, mtime_ns, digests, status and checksum_file.
+        """
+        image_path = os.path.abspath(image_path)
+        checksum = find_checksum(image_path)
+        entry = self.lookup(image_path)
+        # Re-check a cached image only if a checksum file turned up that it was not verified against
+        if entry and (checksum is None or entry["checksum_file"] == checksum[0]):
+            return entry
+
+        st = os.stat(image_path)
+        algorithms = {DEFAULT_ALGORITHM}
+        if checksum:
+            algorithms.add(checksum[1])
+        digests = hash_file(image_path, sorted(algorithms), progress)
+        if checksum is None:
+            status = STATUS_UNVERIFIED
+        else:
+            status = STATUS_VERIFIED if digests[checksum[1]] == checksum[2] else STATUS_MISMATCH
+        entry = {
+            "path": image_path,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "digests": digests,
+            "status": status,
+            "checksum_file": checksum[0] if checksum else None,
+        }
+        with self.lock:
+            self._load()[image_path] = entry
+            self._save()
+        return entry
+
+    def known_images(self):
+        """Cached entries whose file still exists, most recently modified first."""
+        with self.lock:
+            entries = list(self._load().values())
+        entries = [entry for entry in entries if os.path.exists(entry["path"])]
+        return sorted(entries, key=lambda entry: entry["mtime_ns"], reverse=True)
+
+def describe(entry):
+    """One-line, user-facing summary of a check result."""
+    if entry["status"] == STATUS_VERIFIED:
+        return f"Verified against {os.path.basename(entry['checksum_file'])}"
+    if entry["status"] == STATUS_MISMATCH:
+        return f"Checksum MISMATCH with {os.path.basename(entry['checksum_file'])}"
+    return f"No checksum file found (sha256 {entry['digests'][DEFAULT_ALGORITHM][:16]}...)"
+
+def check_in_background(catalog, image_path, on_progress, on_done):
+    """
+    Runs catalog.check on a worker thread. on_progress(done, total) and on_done(entry, error)
+    are called from that thread; Tk callers should forward them with root.after.
+    """
+    def worker():
+        try:
+            entry, error = catalog.check(image_path, on_progress), None
+        except (OSError, ValueError) as e:
+            entry, error = None, e
+        on_done(entry, error)
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    import sys
+
+    catalog = IsoCatalog()
+    for image in sys.argv[1:]:
+        print(f"{image}: {describe(catalog.check(image))}")
@@ -1,8 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import random
+import os
+import re
 import time
 import threading
+import collections
+
+from tk_console import BatchedConsole
+from ui_events import UiEvents
+from vm_registry import VmRegistry, PAGE_SIZE
+from disk_images import (DEFAULT_DISK_GB, DEFAULT_IMAGE_DIR, DiskImageError, backing_chain,
+                         create_disk, create_linked_clone, image_info, image_path_for)
+from disk_jobs import DiskJobQueue, JOB_DONE, JOB_FAILED, JOB_RUNNING
+from qemu_supervisor import (QemuSupervisor, qmp_socket_path,
+                             STATE_BOOTING, STATE_RUNNING, STATE_STOPPING, STATE_EXITED)
+from qmp_client import QmpMonitor, DEFAULT_INTERVAL
+from qemu_profiles import DEFAULT_PROFILE, DEFAULT_VCPUS, PROFILES, pin_vcpus, plan_launch
+from iso_catalog import IsoCatalog, STATUS_MISMATCH, check_in_background, describe
+from vm_snapshots import (DEFAULT_RETENTION, delete_snapshot_offline, list_snapshots, new_snapshot_name,
+                          resumable, snapshots_to_prune)
+
+DEFAULT_SCROLLBACK = 5000 # Console lines kept per VM unless the VM overrides it
+FILTER_DELAY_MS = 150 # Debounce for the sidebar search box
+READY_PATTERN = r"login:" # Serial output that marks a cold boot as ready (per-VM "ready_pattern" overrides)
 
 class QemuManagerApp:
     def __init__(self, root):
@@ -14,8 +34,41 @@ class QemuManagerApp:
         style = ttk.Style()
         style.theme_use('clam')
         
+        # Worker, reader and QMP threads post here; the Tk thread drains it on one tick
+        self.events = UiEvents(root)
+        self.events.on("stats", self._store_stats)
+        self.events.on("vm_state", self._refresh_vm_state)
+
+        # VM definitions live in the registry; the Listbox holds only the loaded page(s) of names
+        self.registry = VmRegistry()
+        self.registry.reset_states()
+        self.list_query = ""
+        self.list_exhausted = False
+        self.list_loading = False
+        self.filter_after_id = None
+        # Per-VM console scrollback; the console pane shows the selected VM's history
+        self.vm_histories = {}
+        self.console_vm = None
+        self.console_lock = threading.Lock()
+        self.supervisor = QemuSupervisor(on_output=self.on_vm_output, on_state=self.on_vm_state)
+        # Live stats from every running VM's QMP socket, sampled on one asyncio loop
+        self.vm_stats = {}
+        # Launch-to-ready timers: name -> (kind, start time, ready regex)
+        self.boot_timers = {}
+        # Host CPUs each running VM's vCPUs are pinned to; pins wait for QMP to report thread ids
+        self.pinned_cpus = {}
+        self.pending_pins = {}
+        self.monitor = QmpMonitor(on_stats=self.on_vm_stats, interval=DEFAULT_INTERVAL)
+        # Hash/verification results for ISO images, shared with the Android installer
+        self.iso_catalog = IsoCatalog()
+        # Slow qemu-img work (compacting, compressing, flattening, deleting) runs a few jobs at a time
+        self.disk_jobs = DiskJobQueue(on_update=lambda job: self.events.progress("disk_job", job, key=job.id))
+        self.events.on("disk_job", self._show_disk_job)
+        self.disk_job_logged = {} # job id -> (state, tens of percent) last written to the console
+        
         self.create_layout()
-        self.populate_mock_machines()
+        self.load_machines()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_layout(self):
         # -- Main Container --
@@ -32,14 +85,41 @@ class QemuManagerApp:
 
         # VM List
         ttk.Label(sidebar_frame, text="Your Machines:", font=("Arial", 10, "bold")).pack(anchor="w")
-        self.vm_list = tk.Listbox(sidebar_frame, height=20)
-        self.vm_list.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", self.on_filter_change)
+        ttk.Entry(sidebar_frame, textvariable=self.filter_var).pack(fill=tk.X, pady=(5, 0))
+        
+        list_frame = ttk.Frame(sidebar_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        list_scroll = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        list_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.vm_list = tk.Listbox(list_frame, height=20, exportselection=False)
+        self.vm_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        list_scroll.config(command=self.vm_list.yview)
+        
+        def on_list_scroll(first, last):
+            list_scroll.set(first, last)
+            # Fetch the next page once the user nears the end of what is loaded
+            if float(last) > 0.9 and not self.list_exhausted and not self.list_loading:
+                self.list_loading = True
+                self.root.after_idle(self.load_more_machines)
+        self.vm_list.config(yscrollcommand=on_list_scroll)
         self.vm_list.bind("<<ListboxSelect>>", self.on_vm_select)
 
         # Start/Stop Buttons
         self.btn_start = ttk.Button(sidebar_frame, text="Start / Boot", state=tk.DISABLED, command=self.start_vm)
         self.btn_start.pack(fill=tk.X, pady=5)
         
+        self.btn_stop = ttk.Button(sidebar_frame, text="Stop VM", state=tk.DISABLED, command=self.stop_vm)
+        self.btn_stop.pack(fill=tk.X, pady=5)
+        
+        self.btn_snapshots = ttk.Button(sidebar_frame, text="Snapshots...", state=tk.DISABLED,
+                                        command=self.open_snapshots_window)
+        self.btn_snapshots.pack(fill=tk.X, pady=5)
+
+        self.btn_disk_jobs = ttk.Button(sidebar_frame, text="Disk Jobs...", command=self.open_disk_jobs_window)
+        self.btn_disk_jobs.pack(fill=tk.X, pady=5)
+        
         self.btn_delete = ttk.Button(sidebar_frame, text="Delete VM", state=tk.DISABLED, command=self.delete_vm)
         self.btn_delete.pack(fill=tk.X, pady=5)
 
@@ -50,25 +130,101 @@ class QemuManagerApp:
         # VM Details Label
         self.lbl_details = ttk.Label(right_frame, text="Select a virtual machine to view details or start.", 
                                      font=("Arial", 12), foreground="#555")
-        self.lbl_details.pack(pady=20)
+        self.lbl_details.pack(pady=(20, 5))
+
+        # Live stats (QMP)
+        stats_frame = ttk.Frame(right_frame)
+        stats_frame.pack(fill=tk.X, pady=(0, 10))
+        self.lbl_stats = ttk.Label(stats_frame, text="", font=("Consolas", 10))
+        self.lbl_stats.pack(side=tk.LEFT)
+        self.spin_interval = ttk.Spinbox(stats_frame, from_=0.5, to=60, increment=0.5, width=5,
+                                         command=self.on_interval_change)
+        self.spin_interval.set(DEFAULT_INTERVAL)
+        self.spin_interval.pack(side=tk.RIGHT)
+        self.spin_interval.bind("<Return>", self.on_interval_change)
+        ttk.Label(stats_frame, text="Sample every (s):").pack(side=tk.RIGHT, padx=5)
 
         # Console Output Area
         ttk.Label(right_frame, text="QEMU Console Output:").pack(anchor="w")
         self.console_output = scrolledtext.ScrolledText(right_frame, height=20, bg="black", fg="#00ff00", font=("Consolas", 10))
         self.console_output.pack(fill=tk.BOTH, expand=True, pady=5)
-        self.console_output.insert(tk.END, "QEMU 7.0.0 monitor - type 'help' for commands\n")
+        self.console = BatchedConsole(self.console_output, max_lines=DEFAULT_SCROLLBACK, events=self.events)
         
-    def populate_mock_machines(self):
-        """Add some existing mock VMs to the list."""
-        mock_vms = ["Ubuntu-Server-22.04", "Windows-11-Dev", "Debian-Testing"]
-        for vm in mock_vms:
-            self.vm_list.insert(tk.END, vm)
+    def load_machines(self, query=""):
+        """(Re)load the sidebar with the first page of VMs matching query."""
+        selected = self.selected_vm()
+        self.list_query = query
+        self.list_exhausted = False
+        self.vm_list.delete(0, tk.END)
+        self.load_more_machines()
+        self.select_in_list(selected)
+
+    def load_more_machines(self):
+        self.list_loading = False
+        if self.list_exhausted:
+            return
+        last = self.vm_list.get(tk.END) if self.vm_list.size() else None
+        names = self.registry.names(self.list_query, after=last)
+        if names:
+            self.vm_list.insert(tk.END, *names)
+        self.list_exhausted = len(names) < PAGE_SIZE
+
+    def on_filter_change(self, *args):
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_after_id = None
+        query = self.filter_var.get().strip()
+        if query == self.list_query:
+            return
+        if self.list_exhausted and self.list_query.lower() in query.lower():
+            # Narrowing a fully loaded result: filter what is already in the list
+            selected = self.selected_vm()
+            needle = query.lower()
+            names = [n for n in self.vm_list.get(0, tk.END) if needle in n.lower()]
+            self.list_query = query
+            self.vm_list.delete(0, tk.END)
+            if names:
+                self.vm_list.insert(tk.END, *names)
+            self.select_in_list(selected)
+        else:
+            self.load_machines(query)
+
+    def select_in_list(self, vm_name):
+        if vm_name is None:
+            return
+        try:
+            index = list(self.vm_list.get(0, tk.END)).index(vm_name)
+        except ValueError:
+            return
+        self.vm_list.selection_set(index)
+        self.vm_list.see(index)
+
+    def add_vm(self, vm):
+        """Stores a new VM definition and shows it in the sidebar."""
+        vm.setdefault("scrollback", DEFAULT_SCROLLBACK)
+        self.registry.add(vm)
+        self.load_machines(self.list_query)
+        self.vm_list.selection_clear(0, tk.END)
+        self.select_in_list(vm["name"])
+        self.on_vm_select(None)
+
+    def vm_history(self, vm):
+        """Returns the VM's console scrollback, creating it on first use (Tk thread only)."""
+        with self.console_lock:
+            history = self.vm_histories.get(vm["name"])
+            if history is None or history.maxlen != vm["scrollback"]:
+                history = collections.deque(history or (), maxlen=vm["scrollback"])
+                self.vm_histories[vm["name"]] = history
+        return history
 
     def open_create_vm_window(self):
         """Opens the 'Create New Virtual Machine' dialog."""
         create_win = tk.Toplevel(self.root)
         create_win.title("Create New Virtual Machine")
-        create_win.geometry("500x400")
+        create_win.geometry("520x560")
         create_win.grab_set() # Modal window
 
         # Form Frame
@@ -94,9 +250,27 @@ class QemuManagerApp:
         iso_frame.grid(row=2, column=1, sticky="ew", pady=10, padx=10)
         
         entry_iso = ttk.Entry(iso_frame, width=30)
-        entry_iso.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        entry_iso.grid(row=0, column=0, sticky="ew")
+        iso_frame.columnconfigure(0, weight=1)
+        lbl_iso_status = ttk.Label(iso_frame, text="", foreground="#555")
+        lbl_iso_status.grid(row=1, column=0, columnspan=2, sticky="w")
         
-        iso_path = {"path": ""} # Store path in mutable dict
+        iso_path = {"path": "", "entry": None} # Store path and its catalog entry in mutable dict
+
+        def show_iso_progress(filename, done, total):
+            if create_win.winfo_exists() and iso_path["path"] == filename:
+                percent = 100 * done // total if total else 100
+                lbl_iso_status.config(text=f"Checking image... {percent}%", foreground="#555")
+
+        def show_iso_result(filename, entry, error):
+            if not create_win.winfo_exists() or iso_path["path"] != filename:
+                return # Dialog closed or another image picked meanwhile
+            if error:
+                lbl_iso_status.config(text=f"Cannot read image: {error}", foreground="#c00")
+                return
+            iso_path["entry"] = entry
+            color = "#c00" if entry["status"] == STATUS_MISMATCH else "#080"
+            lbl_iso_status.config(text=describe(entry), foreground=color)
 
         def browse_iso():
             filename = filedialog.askopenfilename(
@@ -107,9 +281,15 @@ class QemuManagerApp:
                 entry_iso.delete(0, tk.END)
                 entry_iso.insert(0, filename)
                 iso_path["path"] = filename
+                iso_path["entry"] = None
+                check_in_background(
+                    self.iso_catalog, filename,
+                    lambda done, total: self.events.progress("iso", filename, done, total),
+                    lambda entry, error: self.events.call(show_iso_result, filename, entry, error))
 
+        self.events.on("iso", show_iso_progress)
         btn_browse = ttk.Button(iso_frame, text="Browse...", command=browse_iso)
-        btn_browse.pack(side=tk.LEFT, padx=(5,0))
+        btn_browse.grid(row=0, column=1, padx=(5,0))
 
         # Memory Slider
         ttk.Label(form_frame, text="Memory (RAM):").grid(row=3, column=0, sticky="w", pady=10)
@@ -124,108 +304,635 @@ class QemuManagerApp:
             lbl_mem_val.config(text=f"{int(float(val))} MB")
         scale_mem.configure(command=update_mem)
 
+        # Console scrollback
+        ttk.Label(form_frame, text="Console Lines:").grid(row=4, column=0, sticky="w", pady=10)
+        spin_scrollback = ttk.Spinbox(form_frame, from_=500, to=100000, increment=500, width=10)
+        spin_scrollback.set(DEFAULT_SCROLLBACK)
+        spin_scrollback.grid(row=4, column=1, sticky="w", pady=10, padx=10)
+
+        # Disk: a fresh qcow2 of the given size, or a linked clone of a base image
+        ttk.Label(form_frame, text="Disk Size (GB):").grid(row=5, column=0, sticky="w", pady=10)
+        spin_disk = ttk.Spinbox(form_frame, from_=1, to=4096, width=10)
+        spin_disk.set(DEFAULT_DISK_GB)
+        spin_disk.grid(row=5, column=1, sticky="w", pady=10, padx=10)
+
+        ttk.Label(form_frame, text="Linked Clone Of:").grid(row=6, column=0, sticky="w", pady=10)
+        base_frame = ttk.Frame(form_frame)
+        base_frame.grid(row=6, column=1, sticky="ew", pady=10, padx=10)
+        entry_base = ttk.Entry(base_frame, width=30)
+        entry_base.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        def browse_base():
+            filename = filedialog.askopenfilename(
+                title="Select Base Disk Image",
+                filetypes=[("QEMU Disk Images", "*.qcow2 *.img *.raw"), ("All Files", "*.*")]
+            )
+            if filename:
+                entry_base.delete(0, tk.END)
+                entry_base.insert(0, filename)
+
+        ttk.Button(base_frame, text="Browse...", command=browse_base).pack(side=tk.LEFT, padx=(5,0))
+
+        ttk.Label(form_frame, text="Number of VMs:").grid(row=7, column=0, sticky="w", pady=10)
+        spin_count = ttk.Spinbox(form_frame, from_=1, to=100, width=10)
+        spin_count.set(1)
+        spin_count.grid(row=7, column=1, sticky="w", pady=10, padx=10)
+
+        # Performance profile: "compatible" keeps emulated IDE/e1000 for guests without virtio drivers
+        ttk.Label(form_frame, text="Profile:").grid(row=8, column=0, sticky="w", pady=10)
+        combo_profile = ttk.Combobox(form_frame, values=list(PROFILES), state="readonly", width=15)
+        combo_profile.set(DEFAULT_PROFILE)
+        combo_profile.grid(row=8, column=1, sticky="w", pady=10, padx=10)
+
+        ttk.Label(form_frame, text="vCPUs:").grid(row=9, column=0, sticky="w", pady=10)
+        spin_cpus = ttk.Spinbox(form_frame, from_=1, to=os.cpu_count() or 1, width=10)
+        spin_cpus.set(min(DEFAULT_VCPUS, os.cpu_count() or 1))
+        spin_cpus.grid(row=9, column=1, sticky="w", pady=10, padx=10)
+
         # 4. Create Button
         def confirm_create():
             name = entry_name.get().strip()
             iso = entry_iso.get().strip()
+            base = entry_base.get().strip()
             
             if not name:
                 messagebox.showerror("Error", "Please enter a VM Name.")
                 return
-            if not iso:
-                messagebox.showerror("Error", "Please select an ISO Image file.")
+            if not iso and not base:
+                messagebox.showerror("Error", "Please select an ISO Image file or a base disk image.")
+                return
+            try:
+                scrollback = int(spin_scrollback.get())
+                disk_gb = int(spin_disk.get())
+                count = int(spin_count.get())
+                cpus = int(spin_cpus.get())
+            except ValueError:
+                messagebox.showerror("Error", "Console lines, disk size, number of VMs and vCPUs must be numbers.")
+                return
+            if base and not os.path.isfile(base):
+                messagebox.showerror("Error", f"Base image not found: {base}")
+                return
+            if iso and iso == iso_path["path"] and iso_path["entry"] and iso_path["entry"]["status"] == STATUS_MISMATCH:
+                if not messagebox.askyesno("Checksum Mismatch",
+                                           "The ISO does not match its checksum file and may be corrupt.\n"
+                                           "Create the VM anyway?", parent=create_win):
+                    return
+
+            names = [name] if count <= 1 else [f"{name}-{i}" for i in range(1, count + 1)]
+            taken = [n for n in names if self.registry.exists(n)]
+            if taken:
+                messagebox.showerror("Error", f"A VM named '{taken[0]}' already exists.")
                 return
 
-            # Add to list
-            self.vm_list.insert(tk.END, name)
-            self.console_log(f"VM '{name}' created successfully.")
-            self.console_log(f"ISO: {iso}")
+            settings = {"os_type": combo_os.get(), "iso": iso,
+                        "ram": int(float(scale_mem.get())), "scrollback": max(scrollback, 100),
+                        "profile": combo_profile.get(), "cpus": max(cpus, 1)}
             create_win.destroy()
+            threading.Thread(target=self.create_vms, args=(names, settings, base, disk_gb), daemon=True).start()
 
         btn_create = ttk.Button(form_frame, text="Create Virtual Machine", command=confirm_create)
-        btn_create.grid(row=4, column=0, columnspan=3, pady=20, sticky="ew")
+        btn_create.grid(row=10, column=0, columnspan=3, pady=20, sticky="ew")
+
+    def create_vms(self, names, settings, base, disk_gb):
+        """Worker thread: creates each VM's disk (or linked clone), then registers it on the Tk thread."""
+        for name in names:
+            disk = image_path_for(name)
+            started = time.perf_counter()
+            try:
+                if base:
+                    create_linked_clone(base, disk)
+                else:
+                    create_disk(disk, disk_gb)
+                chain = backing_chain(disk)
+            except DiskImageError as e:
+                self.console_log(f"Error creating disk for '{name}': {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            vm = dict(settings, name=name, disk=disk)
+            self.events.call(self._finish_create_vm, vm, chain, elapsed)
+
+    def _finish_create_vm(self, vm, chain, elapsed):
+        try:
+            self.add_vm(vm)
+        except ValueError as e:
+            self.console_log(f"Error: {e}")
+            return
+        self.registry.set_disk_chain(vm["name"], chain)
+        self.console_log(f"VM '{vm['name']}' created successfully.")
+        if vm["iso"]:
+            self.console_log(f"ISO: {vm['iso']}")
+        kind = f"linked clone of {chain[1]}" if len(chain) > 1 else "new qcow2 disk"
+        self.console_log(f"Disk: {vm['disk']} ({kind}, {elapsed:.2f}s)")
+
+    def release_images(self, chain):
+        """
+        Deletes images of a removed VM that no other VM still uses.
+        Only files inside the manager's image directory are removed; user-supplied
+        base images are never touched.
+        """
+        image_dir = os.path.abspath(DEFAULT_IMAGE_DIR)
+        for path in chain:
+            users = self.registry.image_users(path)
+            if users:
+                self.console_log(f"Kept {os.path.basename(path)}: still used by {len(users)} VM(s).")
+                continue
+            if os.path.commonpath([os.path.abspath(path), image_dir]) != image_dir:
+                continue
+            if os.path.exists(path):
+                self.disk_jobs.delete(path)
 
     def on_vm_select(self, event):
         """Enable buttons when a VM is selected."""
         selection = self.vm_list.curselection()
         if selection:
-            self.btn_start.config(state=tk.NORMAL)
-            self.btn_delete.config(state=tk.NORMAL)
             vm_name = self.vm_list.get(selection[0])
-            self.lbl_details.config(text=f"Selected: {vm_name}")
-            self.console_log(f"Selected VM: {vm_name}")
+            self.update_vm_controls(vm_name)
+            if vm_name != self.console_vm:
+                self.show_vm_console(vm_name)
+                self.console_log(f"Selected VM: {vm_name}")
         else:
             self.btn_start.config(state=tk.DISABLED)
+            self.btn_stop.config(state=tk.DISABLED)
+            self.btn_snapshots.config(state=tk.DISABLED)
             self.btn_delete.config(state=tk.DISABLED)
 
+    def selected_vm(self):
+        selection = self.vm_list.curselection()
+        return self.vm_list.get(selection[0]) if selection else None
+
+    def update_vm_controls(self, vm_name):
+        """Sync buttons and the details label with the VM's lifecycle state."""
+        vm = self.registry.get(vm_name)
+        if vm is None:
+            return
+        state = self.supervisor.state(vm_name)
+        running = self.supervisor.is_running(vm_name)
+        self.btn_start.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.btn_stop.config(state=tk.NORMAL if running and state != STATE_STOPPING else tk.DISABLED)
+        self.btn_delete.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.btn_snapshots.config(state=tk.NORMAL if vm.get("disk") else tk.DISABLED)
+        status = state or "stopped"
+        if state == STATE_EXITED:
+            status = f"exited (code {self.supervisor.vms[vm_name].exit_code})"
+        self.lbl_details.config(text=f"Selected: {vm_name}  |  {vm['os_type']}, {vm['ram']} MB  |  {status}")
+        self.show_stats(vm_name)
+
+    def on_interval_change(self, event=None):
+        try:
+            self.monitor.set_interval(float(self.spin_interval.get()))
+        except ValueError:
+            pass
+
+    def on_vm_stats(self, vm_name, stats):
+        """Called from the QMP monitor thread only when a VM's values change."""
+        self.events.progress("stats", vm_name, stats, key=vm_name)
+
+    def _store_stats(self, vm_name, stats):
+        self.vm_stats[vm_name] = stats
+        if vm_name in self.pending_pins and stats.get("vcpu_threads"):
+            self.apply_pins(vm_name, stats["vcpu_threads"])
+        elif "error" in stats:
+            self.pending_pins.pop(vm_name, None) # No more samples are coming to pin with
+        timer = self.boot_timers.get(vm_name)
+        if timer and timer[0] == "restore" and stats.get("status") == "running":
+            # -loadvm finishes before QMP answers, so the first "running" sample marks the resume
+            self.finish_boot_timer(vm_name)
+        if self.selected_vm() == vm_name:
+            self.show_stats(vm_name)
+
+    def show_stats(self, vm_name):
+        stats = self.vm_stats.get(vm_name)
+        if not stats or not self.supervisor.is_running(vm_name):
+            self.lbl_stats.config(text="")
+        elif "error" in stats:
+            self.lbl_stats.config(text=f"Stats unavailable: {stats['error']}")
+        else:
+            cpu = f"{stats['cpu_percent']}%" if stats["cpu_percent"] is not None else "n/a"
+            mem = f"{stats['memory_mb']} MB" if stats["memory_mb"] is not None else "n/a"
+            mb = 1024 * 1024
+            self.lbl_stats.config(text=f"{stats['status']}  |  {stats['vcpus']} vCPU {cpu}  |  "
+                                       f"RAM {mem}  |  disk R {stats['read_bytes'] // mb} MB "
+                                       f"W {stats['written_bytes'] // mb} MB")
+
     def delete_vm(self):
         selection = self.vm_list.curselection()
         if selection:
             vm_name = self.vm_list.get(selection[0])
+            if self.supervisor.is_running(vm_name):
+                messagebox.showerror("Error", f"Stop '{vm_name}' before deleting it.")
+                return
             if messagebox.askyesno("Delete VM", f"Are you sure you want to delete '{vm_name}'?"):
                 self.vm_list.delete(selection[0])
+                chain = self.registry.disk_chain(vm_name)
+                self.registry.delete(vm_name)
+                self.release_images(chain)
+                with self.console_lock:
+                    self.vm_histories.pop(vm_name, None)
+                    if self.console_vm == vm_name:
+                        self.console_vm = None
                 self.lbl_details.config(text="Select a virtual machine...")
                 self.console_log(f"VM '{vm_name}' deleted.")
                 self.btn_start.config(state=tk.DISABLED)
+                self.btn_stop.config(state=tk.DISABLED)
                 self.btn_delete.config(state=tk.DISABLED)
 
-    def start_vm(self):
-        """Simulates starting a QEMU VM in a separate thread."""
-        selection = self.vm_list.curselection()
-        if not selection:
+    def start_vm(self, vm_name=None, snapshot=None):
+        """Launches the selected VM through the QEMU supervisor, resuming from snapshot if given."""
+        vm_name = vm_name or self.selected_vm()
+        if not vm_name:
             return
 
-        vm_name = self.vm_list.get(selection[0])
+        vm = self.registry.get(vm_name)
+        if self.disk_jobs_for(vm_name):
+            self.console_log("Error: wait for this VM's disk jobs to finish (or cancel them) first.", vm=vm_name)
+            return
+        users = self.registry.image_users(os.path.abspath(vm["disk"])) if vm.get("disk") else []
+        clones = [name for name in users if name != vm_name]
+        # Linked clones read their unchanged blocks from this disk, so writing to it corrupts them
+        if clones and not messagebox.askyesno(
+                "Disk is a base image",
+                f"{', '.join(clones)} use{'s' if len(clones) == 1 else ''} the disk of '{vm_name}' as a base image. "
+                f"Booting '{vm_name}' writes to it and will corrupt those linked clones. Start anyway?",
+                icon=messagebox.WARNING, default=messagebox.NO):
+            return
+        if snapshot:
+            vm["restore_snapshot"] = snapshot
+        self.vm_history(vm)
         self.btn_start.config(state=tk.DISABLED)
-        self.console_log(f"Executing: qemu-system-x86_64 -name {vm_name} -m 2048 -cdrom {vm_name}.iso ...")
-        
-        # Start simulation thread
-        threading.Thread(target=self.simulate_boot_sequence, args=(vm_name,), daemon=True).start()
-
-    def simulate_boot_sequence(self, vm_name):
-        """Generates fake BIOS boot logs."""
-        boot_logs = [
-            f"qemu-system-x86_64: -machine accel=kvm",
-            f"SeaBIOS (version 1.16.0)",
-            "",
-            f"QEMU VGABIOS: VGABIOS ptser, build date",
-            "",
-            f"Found VBE device at 0x...",
-            f"Booting from DVD/CD {vm_name}.iso...",
-            "",
-            f"Loading Linux kernel ...",
-            f"Loading initial ramdisk ...",
-            f"[    0.000000] Linux version 5.15.0-generic (buildd@lgw01-amd64-001)",
-            f"[    0.000001] Command line: BOOT_IMAGE=/casper/vmlinuz file=/cdrom/preseed/ubuntu.seed boot=casper quiet splash --",
-            f"[    0.000002] x86/fpu: Supporting XSAVE feature 0x001: 'x87 floating point registers'",
-            f"[    0.123456] ACPI: DSDT 00000000000 (v02 BOCHS  BXPCDSDT 00000001 BXPC 00000001)",
-            f"[    0.456789] systemd[1]: Detected architecture x86-64.",
-            "",
-            f"Welcome to {vm_name} Installer!",
-            "",
-            "Starting graphical installer..."
-        ]
-
-        self.console_log("-" * 50)
-        
-        for line in boot_logs:
-            time.sleep(random.uniform(0.1, 0.5)) # Simulate processing time
-            self.console_log(line)
-        
-        self.console_log("-" * 50)
-        self.console_log("VM Boot Complete. (Simulation)")
-        
-        # Re-enable button after boot
-        self.root.after(0, lambda: self.btn_start.config(state=tk.NORMAL))
+        reserved = [cpu for name, cpus in self.pinned_cpus.items() if name != vm_name for cpu in cpus]
+        plan = plan_launch(vm, reserved_cpus=reserved)
+        self.console_log(f"Profile: {plan.profile}", vm=vm_name)
+        for note in plan.notes:
+            self.console_log(f"Note: {note}", vm=vm_name)
+        if plan.pin_cpus:
+            self.pending_pins[vm_name] = plan.pin_cpus # Reserved in pinned_cpus once applied
+        self.console_log(f"Executing: {' '.join(self.supervisor.build_command(vm))}", vm=vm_name)
+        pattern = re.compile(vm.get("ready_pattern") or READY_PATTERN)
+        self.boot_timers[vm_name] = ("restore" if snapshot else "cold", time.perf_counter(), pattern)
+        try:
+            self.supervisor.start(vm)
+        except FileNotFoundError:
+            self.boot_timers.pop(vm_name, None)
+            self.release_pins(vm_name)
+            self.console_log(f"Error: {self.supervisor.binary} not found. Install QEMU or set QEMU_BINARY.", vm=vm_name)
+            self.update_vm_controls(vm_name)
+        except (OSError, RuntimeError) as e:
+            self.boot_timers.pop(vm_name, None)
+            self.release_pins(vm_name)
+            self.console_log(f"Error: {e}", vm=vm_name)
+            self.update_vm_controls(vm_name)
+
+    def release_pins(self, vm_name):
+        self.pinned_cpus.pop(vm_name, None)
+        self.pending_pins.pop(vm_name, None)
+
+    def apply_pins(self, vm_name, thread_ids):
+        """Pins vCPU threads once QMP has reported them; called with each stats sample until then."""
+        cpus = self.pending_pins.pop(vm_name)
+        try:
+            pin_vcpus(thread_ids, cpus)
+        except OSError as e:
+            self.console_log(f"vCPU pinning failed: {e}", vm=vm_name)
+            return
+        self.pinned_cpus[vm_name] = cpus[:len(thread_ids)]
+        self.console_log(f"Pinned vCPUs to host CPUs {', '.join(map(str, self.pinned_cpus[vm_name]))}.", vm=vm_name)
+
+    def finish_boot_timer(self, vm_name):
+        """Records how long the VM took from launch to ready. Safe from any thread."""
+        timer = self.boot_timers.pop(vm_name, None)
+        if timer is None:
+            return
+        kind, started, _ = timer
+        elapsed = time.perf_counter() - started
+        self.registry.add_boot_time(vm_name, kind, elapsed)
+        label = "Restored from snapshot" if kind == "restore" else "Cold boot ready"
+        self.console_log(f"{label} in {elapsed:.1f}s.", vm=vm_name)
+
+    def stop_vm(self):
+        vm_name = self.selected_vm()
+        if vm_name:
+            self.console_log(f"Stopping VM '{vm_name}'...", vm=vm_name)
+            self.supervisor.stop(vm_name)
+
+    def on_vm_output(self, vm_name, line, stream_name):
+        """Called from reader threads for every line QEMU prints."""
+        prefix = "!" if stream_name == "stderr" else ">"
+        self.console_log(f"{prefix} {line}", vm=vm_name)
+        timer = self.boot_timers.get(vm_name)
+        if timer and timer[0] == "cold" and timer[2].search(line):
+            self.finish_boot_timer(vm_name)
+
+    def on_vm_state(self, vm_name, state, exit_code):
+        """Called from supervisor threads on lifecycle changes."""
+        if state == STATE_BOOTING:
+            self.monitor.add(vm_name, qmp_socket_path(vm_name), pid=self.supervisor.vms[vm_name].process.pid)
+        elif state == STATE_EXITED:
+            self.monitor.remove(vm_name)
+            self.boot_timers.pop(vm_name, None)
+        if state == STATE_EXITED:
+            self.console_log(f"VM '{vm_name}' exited with code {exit_code}.", vm=vm_name)
+        elif state in (STATE_BOOTING, STATE_RUNNING):
+            self.console_log(f"VM '{vm_name}' is {state}.", vm=vm_name)
+        self.events.progress("vm_state", vm_name, key=vm_name)
+
+    def _refresh_vm_state(self, vm_name):
+        state = self.supervisor.state(vm_name)
+        if state == STATE_EXITED:
+            self.release_pins(vm_name)
+        if state is not None and self.registry.exists(vm_name):
+            self.registry.set_state(vm_name, "stopped" if state == STATE_EXITED else state)
+        if self.selected_vm() == vm_name:
+            self.update_vm_controls(vm_name)
+
+    def on_close(self):
+        self.disk_jobs.shutdown()
+        self.events.stop()
+        self.monitor.stop()
+        self.supervisor.stop_all()
+        self.registry.reset_states()
+        self.registry.close()
+        self.root.destroy()
+
+    def run_in_background(self, work, on_done):
+        """Runs work() on a thread and calls on_done(result, error) on the Tk thread."""
+        def runner():
+            try:
+                result, error = work(), None
+            except Exception as e:
+                result, error = None, e
+            self.events.call(on_done, result, error)
+        threading.Thread(target=runner, daemon=True).start()
+
+    def open_snapshots_window(self):
+        """Lists a VM's qcow2 snapshots and offers save, restore (fast boot) and delete."""
+        vm_name = self.selected_vm()
+        vm = self.registry.get(vm_name) if vm_name else None
+        if not vm or not vm.get("disk"):
+            messagebox.showerror("Error", "Snapshots need a VM with a qcow2 disk.")
+            return
+
+        win = tk.Toplevel(self.root)
+        win.title(f"Snapshots - {vm_name}")
+        win.geometry("560x380")
+        frame = ttk.Frame(win, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        tree = ttk.Treeview(frame, columns=("name", "date", "state"), show="headings", height=10)
+        tree.heading("name", text="Snapshot")
+        tree.heading("date", text="Taken")
+        tree.heading("state", text="VM State")
+        tree.column("state", width=90, anchor="e")
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        lbl_times = ttk.Label(frame, text="")
+        lbl_times.pack(anchor="w", pady=5)
+
+        options = ttk.Frame(frame)
+        options.pack(fill=tk.X)
+        ttk.Label(options, text="Keep newest:").pack(side=tk.LEFT)
+        spin_keep = ttk.Spinbox(options, from_=1, to=50, width=5)
+        spin_keep.set(vm.get("snapshot_retention", DEFAULT_RETENTION))
+        spin_keep.pack(side=tk.LEFT, padx=5)
+
+        buttons = ttk.Frame(frame)
+        buttons.pack(fill=tk.X, pady=(10, 0))
+        snapshots = []
+
+        def retention():
+            try:
+                keep = max(int(spin_keep.get()), 1)
+            except ValueError:
+                keep = DEFAULT_RETENTION
+            self.registry.update(vm_name, snapshot_retention=keep)
+            return keep
+
+        def show_times():
+            summary = self.registry.boot_time_summary(vm_name)
+            parts = []
+            for kind, label in (("cold", "Cold boot"), ("restore", "Restore")):
+                if kind in summary:
+                    avg, count = summary[kind]
+                    parts.append(f"{label}: {avg:.1f}s avg ({count} runs)")
+            if "cold" in summary and "restore" in summary and summary["restore"][0] > 0:
+                parts.append(f"{summary['cold'][0] / summary['restore'][0]:.1f}x faster")
+            lbl_times.config(text="  |  ".join(parts) or "No boot times recorded yet.")
+
+        def refresh():
+            def done(result, error):
+                if not win.winfo_exists():
+                    return
+                if error:
+                    self.console_log(f"Error listing snapshots: {error}", vm=vm_name)
+                    return
+                snapshots[:] = result
+                tree.delete(*tree.get_children())
+                for snap in reversed(result):
+                    size = f"{snap['vm_state_size'] // (1024 * 1024)} MB" if resumable(snap) else "disk only"
+                    tree.insert("", tk.END, iid=snap["name"], values=(
+                        snap["name"], time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snap["date"])), size))
+                show_times()
+            self.run_in_background(lambda: list_snapshots(vm["disk"]), done)
+
+        def drop(names, on_done=None):
+            """Deletes snapshots through the live monitor if running, else with qemu-img."""
+            running = self.supervisor.is_running(vm_name)
+            def work():
+                for name in names:
+                    if running:
+                        self.monitor.human_command(vm_name, f"delvm {name}").result()
+                    else:
+                        delete_snapshot_offline(vm["disk"], name)
+            def done(result, error):
+                if error:
+                    self.console_log(f"Error deleting snapshot: {error}", vm=vm_name)
+                elif names:
+                    self.console_log(f"Deleted snapshot(s): {', '.join(names)}", vm=vm_name)
+                if win.winfo_exists():
+                    refresh()
+            self.run_in_background(work, done)
+
+        def save():
+            if not self.supervisor.is_running(vm_name):
+                messagebox.showerror("Error", "Start the VM first; snapshots capture a running VM.", parent=win)
+                return
+            tag = new_snapshot_name()
+            self.console_log(f"Saving snapshot {tag} (the VM pauses while RAM is written)...", vm=vm_name)
+            def done(result, error):
+                if error:
+                    self.console_log(f"Error saving snapshot: {error}", vm=vm_name)
+                    return
+                self.console_log(f"Snapshot {tag} saved.", vm=vm_name)
+                keep = retention()
+                self.run_in_background(lambda: list_snapshots(vm["disk"]),
+                                       lambda snaps, err: drop(snapshots_to_prune(snaps or [], keep)))
+            self.run_in_background(lambda: self.monitor.human_command(vm_name, f"savevm {tag}").result(), done)
 
-    def console_log(self, message):
-        """Thread-safe way to update the console."""
-        self.root.after(0, self._update_console, message)
+        def restore():
+            selection = tree.selection()
+            if not selection:
+                return
+            snap = next(s for s in snapshots if s["name"] == selection[0])
+            if self.supervisor.is_running(vm_name):
+                messagebox.showerror("Error", "Stop the VM before restoring a snapshot.", parent=win)
+                return
+            if not resumable(snap):
+                messagebox.showerror("Error", "This snapshot has no saved VM state to resume from.", parent=win)
+                return
+            self.start_vm(vm_name, snapshot=snap["name"])
+
+        def delete():
+            selection = tree.selection()
+            if selection and messagebox.askyesno("Delete Snapshot", f"Delete '{selection[0]}'?", parent=win):
+                drop(list(selection))
+
+        ttk.Button(buttons, text="Save Snapshot", command=save).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(buttons, text="Restore && Boot", command=restore).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Delete", command=delete).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Refresh", command=refresh).pack(side=tk.RIGHT)
+        spin_keep.config(command=retention)
+        refresh()
+
+    def disk_jobs_for(self, vm_name):
+        return [job for job in self.disk_jobs.jobs() if job.vm == vm_name and not job.finished]
+
+    def queue_disk_job(self, vm_name, kind):
+        """Queues compact, compress or flatten for a stopped VM's disk."""
+        vm = self.registry.get(vm_name)
+        if self.supervisor.is_running(vm_name):
+            messagebox.showerror("Error", "Stop the VM before rewriting its disk.")
+            return
+        if self.disk_jobs_for(vm_name):
+            messagebox.showerror("Error", f"'{vm_name}' already has a disk job queued.")
+            return
+        chain = self.registry.disk_chain(vm_name) or [vm["disk"]]
+        if kind == "flatten" and len(chain) < 2:
+            messagebox.showerror("Error", f"'{vm_name}' is not a linked clone.")
+            return
+        # Compacting a linked clone keeps it one; only flatten copies the backing data in
+        backing = chain[1] if kind != "flatten" and len(chain) > 1 else None
+
+        def inspect():
+            backing_format = image_info(backing)["format"] if backing else None
+            return backing_format, list_snapshots(vm["disk"])
+
+        def submit(result, error):
+            if error:
+                self.console_log(f"Error reading {vm['disk']}: {error}", vm=vm_name)
+                return
+            backing_format, snapshots = result
+            # qemu-img convert copies only the current disk state, not internal snapshots
+            if snapshots and not messagebox.askyesno(
+                    "Snapshots will be lost",
+                    f"{kind.title()} rewrites the disk without its {len(snapshots)} snapshot(s), "
+                    f"including any used for fast boot. Continue?"):
+                return
+            # The VM may have been started while its disk was inspected or the dialog was open
+            if self.supervisor.is_running(vm_name):
+                messagebox.showerror("Error", "Stop the VM before rewriting its disk.")
+                return
+            if self.disk_jobs_for(vm_name):
+                messagebox.showerror("Error", f"'{vm_name}' already has a disk job queued.")
+                return
+            self.disk_jobs.rewrite(vm["disk"], compress=kind == "compress", backing=backing,
+                                   backing_format=backing_format, kind=kind, vm=vm_name)
+        self.run_in_background(inspect, submit)
+
+    def _show_disk_job(self, job):
+        """Writes disk job state changes, and progress every 10%, to the console."""
+        step = int(job.percent) // 10
+        last = self.disk_job_logged.get(job.id)
+        if last == (job.state, step):
+            return
+        self.disk_job_logged[job.id] = (job.state, step)
+        if job.state == JOB_RUNNING and last is not None and last[0] == JOB_RUNNING:
+            self.console_log(f"{job.description}: {int(job.percent)}%", vm=job.vm)
+        elif job.state == JOB_DONE:
+            size = ""
+            if job.kind != "delete" and os.path.exists(job.path):
+                size = f" ({os.path.getsize(job.path) // (1024 * 1024)} MB)"
+            self.console_log(f"{job.description}: done{size}.", vm=job.vm)
+            if job.kind == "flatten" and job.vm and self.registry.exists(job.vm):
+                self.registry.set_disk_chain(job.vm, [job.path])
+        elif job.state == JOB_FAILED:
+            self.console_log(f"{job.description} failed: {job.error}", vm=job.vm)
+        else:
+            self.console_log(f"{job.description}: {job.state}.", vm=job.vm)
+
+    def open_disk_jobs_window(self):
+        """Queued and running disk jobs, with actions for the selected VM's disk."""
+        vm_name = self.selected_vm()
+        vm = self.registry.get(vm_name) if vm_name else None
+        win = tk.Toplevel(self.root)
+        win.title("Disk Jobs")
+        win.geometry("560x340")
+        frame = ttk.Frame(win, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        tree = ttk.Treeview(frame, columns=("job", "state", "progress"), show="headings", height=10)
+        tree.heading("job", text="Job")
+        tree.heading("state", text="State")
+        tree.heading("progress", text="Progress")
+        tree.column("state", width=90)
+        tree.column("progress", width=80, anchor="e")
+        tree.pack(fill=tk.BOTH, expand=True)
 
-    def _update_console(self, message):
+        actions = ttk.Frame(frame)
+        actions.pack(fill=tk.X, pady=(10, 0))
+        disk_state = tk.NORMAL if vm and vm.get("disk") else tk.DISABLED
+        for label, kind in (("Compact", "compact"), ("Compress", "compress"), ("Flatten Clone", "flatten")):
+            ttk.Button(actions, text=label, state=disk_state,
+                       command=lambda kind=kind: self.queue_disk_job(vm_name, kind)).pack(side=tk.LEFT, padx=(0, 5))
+        if vm_name:
+            ttk.Label(actions, text=f"for {vm_name}").pack(side=tk.LEFT, padx=5)
+
+        def cancel():
+            for iid in tree.selection():
+                self.disk_jobs.cancel(int(iid))
+
+        def clear():
+            self.disk_jobs.clear_finished()
+
+        ttk.Button(actions, text="Clear Finished", command=clear).pack(side=tk.RIGHT)
+        ttk.Button(actions, text="Cancel", command=cancel).pack(side=tk.RIGHT, padx=5)
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            jobs = {str(job.id): job for job in self.disk_jobs.jobs()}
+            for iid in tree.get_children():
+                if iid not in jobs:
+                    tree.delete(iid)
+            for iid, job in jobs.items():
+                values = (job.description, job.state, f"{job.percent:.0f}%")
+                if tree.exists(iid):
+                    tree.item(iid, values=values)
+                else:
+                    tree.insert("", tk.END, iid=iid, values=values)
+            win.after(500, refresh)
+        refresh()
+
+    def console_log(self, message, vm=None):
+        """
+        Thread-safe way to update the console.
+        Lines for a VM go to its scrollback and are shown only while it is selected;
+        lines without a VM are manager messages and always shown.
+        """
         timestamp = time.strftime("%H:%M:%S")
-        self.console_output.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.console_output.see(tk.END)
+        line = f"[{timestamp}] {message}\n"
+        with self.console_lock:
+            history = self.vm_histories.get(vm)
+            if history is not None:
+                history.append(line)
+            if vm is None or vm == self.console_vm:
+                self.console.write(line)
+
+    def show_vm_console(self, vm_name):
+        """Switch the console pane to a VM's scrollback, capped at its configured line count."""
+        vm = self.registry.get(vm_name)
+        history = self.vm_history(vm)
+        with self.console_lock:
+            self.console_vm = vm_name
+            self.console.replace(list(history), max_lines=vm["scrollback"])
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,163 @@
+import codecs
+import errno
+import fcntl
+import os
+import pty
+import select
+import selectors
+import signal
+import struct
+import termios
+import threading
+import time
+
+# --- Configuration ---
+# Override with the TERMINAL_SHELL environment variable; defaults to the user's login shell
+DEFAULT_SHELL = os.environ.get("TERMINAL_SHELL") or os.environ.get("SHELL") or "/bin/bash"
+READ_SIZE = 64 * 1024
+CLOSE_TIMEOUT_SECONDS = 2.0 # Time allowed after SIGHUP before the shell is killed
+
+class PtySession:
+    """
+    An interactive shell on a pseudo-terminal. Output is read on one thread that waits on a
+    selector, so a busy or silent child never blocks the caller. on_output(text) and
+    on_exit(code) are called from that thread.
+    """
+
+    def __init__(self, on_output, on_exit=None, shell=DEFAULT_SHELL, cwd=None, env=None, rows=24, cols=80):
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.shell = shell
+        self.cwd = cwd or os.path.expanduser("~")
+        self.env = dict(os.environ if env is None else env)
+        self.env.setdefault("TERM", "xterm-256color")
+        # The console cannot address the cursor or switch screens, so full-screen pagers are unusable
+        for name in ("PAGER", "GIT_PAGER", "MANPAGER"):
+            self.env.setdefault(name, "cat")
+        self.rows = rows
+        self.cols = cols
+        self.pid = None
+        self.fd = None
+        self.exit_code = None
+
+    def start(self):
+        """Forks the shell. Raises OSError if it cannot be started."""
+        pid, fd = pty.fork()
+        if pid == 0:
+            # Child: pty.fork() already made the terminal our controlling tty and stdio
+            try:
+                os.chdir(self.cwd)
+                os.execvpe(self.shell, [self.shell, "-i"], self.env)
+            finally:
+                os._exit(127)
+        self.pid, self.fd = pid, fd
+        os.set_blocking(fd, False)
+        self.resize(self.rows, self.cols)
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def _read_loop(self):
+        # Multi-byte characters can be split across reads; the incremental decoder keeps the tail
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        selector = selectors.DefaultSelector()
+        selector.register(self.fd, selectors.EVENT_READ)
+        try:
+            while True:
+                for _ in selector.select():
+                    try:
+                        data = os.read(self.fd, READ_SIZE)
+                    except BlockingIOError:
+                        continue
+                    except OSError as e:
+                        if e.errno == errno.EIO: # Linux reports EIO once the child side is closed
+                            return
+                        raise
+                    if not data:
+                        return
+                    text = decoder.decode(data)
+                    if text:
+                        self.on_output(text)
+        finally:
+            selector.close()
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                self.on_output(tail)
+            self._reap()
+
+    def _reap(self):
+        try:
+            _, status = os.waitpid(self.pid, 0)
+            self.exit_code = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            pass
+        os.close(self.fd)
+        if self.on_exit:
+            self.on_exit(self.exit_code)
+
+    def is_alive(self):
+        return self.pid is not None and self.exit_code is None
+
+    def echo_enabled(self):
+        """Whether the terminal echoes input; programs turn this off to read passwords."""
+        return bool(termios.tcgetattr(self.fd)[3] & termios.ECHO)
+
+    def at_prompt(self):
+        """
+        Whether the next line goes to the shell as a command rather than to a program's stdin
+        or a hidden read. Readline turns ECHO off at its prompt because it echoes by itself,
+        so a line-buffered read without echo is what marks a password prompt.
+        """
+        try:
+            if os.tcgetpgrp(self.fd) != self.pid:
+                return False # A foreground job is reading the terminal
+            return self.echo_enabled() or not termios.tcgetattr(self.fd)[3] & termios.ICANON
+        except OSError:
+            return False
+
+    def write(self, text):
+        """Sends keystrokes (a str) to the shell, as if typed at the terminal."""
+        data = text.encode("utf-8")
+        while data:
+            try:
+                written = os.write(self.fd, data)
+            except BlockingIOError:
+                # The child is not reading and the terminal buffer is full; wait until it drains
+                select.select([], [self.fd], [])
+                continue
+            data = data[written:]
+
+    def interrupt(self):
+        """Ctrl-C: the terminal's line discipline turns it into SIGINT for the foreground job."""
+        self.write("\x03")
+
+    def send_eof(self):
+        self.write("\x04")
+
+    def resize(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        if self.fd is not None:
+            fcntl.ioctl(self.fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+    def current_directory(self):
+        """The shell's working directory, read from /proc (None where unavailable)."""
+        try:
+            return os.readlink(f"/proc/{self.pid}/cwd")
+        except (OSError, TypeError):
+            return None
+
+    def close(self):
+        """Hangs up the terminal, like closing a terminal window, and kills the shell if it lingers."""
+        if not self.is_alive():
+            return
+        try:
+            os.killpg(os.getpgid(self.pid), signal.SIGHUP)
+        except OSError:
+            pass
+
+        def _escalate():
+            time.sleep(CLOSE_TIMEOUT_SECONDS)
+            if self.is_alive():
+                try:
+                    os.kill(self.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        threading.Thread(target=_escalate, daemon=True).start()
@@ -0,0 +1,153 @@
+import collections
+import functools
+import os
+
+# --- Configuration ---
+KVM_DEVICE = "/dev/kvm"
+HUGEPAGES_MOUNT = "/dev/hugepages"
+DEFAULT_PROFILE = "balanced" # For new VMs; VMs created before profiles existed keep "compatible"
+DEFAULT_VCPUS = 2
+
+# accel: auto (KVM when usable, else TCG), kvm or tcg. disk_bus/nic: virtio, or None for QEMU's
+# emulated defaults. aio: auto (io_uring where the kernel has it, else native), io_uring, native
+# or threads. pin: False, "auto" (free host CPUs, highest first) or a CPU list such as "2-5,7".
+# balloon: add a virtio-balloon device, which is what QMP query-balloon reports guest memory from.
+# Any of these keys set on a VM definition overrides its profile.
+PROFILES = {
+    # Emulated IDE and e1000, which every guest has drivers for; VMs without a profile get this
+    "compatible": {"accel": "auto", "cpu": None, "disk_bus": None, "nic": None, "cache": None, "aio": None,
+                   "iothread": False, "hugepages": False, "pin": False, "balloon": False},
+    "balanced": {"accel": "auto", "cpu": "host", "disk_bus": "virtio", "nic": "virtio", "cache": "none", "aio": "auto",
+                 "iothread": True, "hugepages": False, "pin": False, "balloon": True},
+    "performance": {"accel": "auto", "cpu": "host", "disk_bus": "virtio", "nic": "virtio", "cache": "none", "aio": "auto",
+                    "iothread": True, "hugepages": True, "pin": "auto", "balloon": True},
+}
+
+HostCapabilities = collections.namedtuple("HostCapabilities", "kvm io_uring hugepages_free_mb cpus")
+# args: QEMU arguments for CPU, memory, disk and network; notes: fallbacks taken, for the log;
+# pin_cpus: host CPU per vCPU, applied with pin_vcpus() once QMP reports the vCPU threads
+LaunchPlan = collections.namedtuple("LaunchPlan", "profile args notes pin_cpus")
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def _kernel_has_io_uring(release, disabled_setting):
+    if disabled_setting.strip() not in ("", "0"):
+        return False # kernel.io_uring_disabled (6.6+)
+    try:
+        major, minor = (int(part) for part in release.split(".")[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (5, 6) # The first release with everything QEMU's io_uring backend uses
+
+@functools.lru_cache(maxsize=1)
+def detect_host():
+    """What this machine offers; cached, since none of it changes while the manager runs."""
+    meminfo = dict(line.split(":", 1) for line in _read_text("/proc/meminfo").splitlines() if ":" in line)
+    try:
+        free_pages = int(meminfo.get("HugePages_Free", "0"))
+        page_kb = int(meminfo.get("Hugepagesize", "0 kB").split()[0])
+    except ValueError:
+        free_pages = page_kb = 0
+    hugepages_free_mb = free_pages * page_kb // 1024 if os.path.isdir(HUGEPAGES_MOUNT) else 0
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    return HostCapabilities(
+        kvm=os.access(KVM_DEVICE, os.R_OK | os.W_OK),
+        io_uring=_kernel_has_io_uring(os.uname().release, _read_text("/proc/sys/kernel/io_uring_disabled")),
+        hugepages_free_mb=hugepages_free_mb,
+        cpus=tuple(cpus),
+    )
+
+def parse_cpu_list(text):
+    """"0-3,6" -> [0, 1, 2, 3, 6], the format of taskset and /sys/devices/system/cpu/online."""
+    cpus = []
+    for part in str(text).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+def profile_settings(vm):
+    """The VM's profile with its per-VM overrides applied; raises KeyError for an unknown profile."""
+    name = vm.get("profile") or "compatible"
+    settings = dict(PROFILES[name])
+    settings.update({key: vm[key] for key in PROFILES[name] if key in vm})
+    return name, settings
+
+def plan_launch(vm, host=None, reserved_cpus=()):
+    """
+    Works out the tuned part of a VM's command line. Pure apart from detect_host(), so a
+    HostCapabilities can be passed in to see what any machine would get. reserved_cpus are
+    host CPUs already pinned by other VMs, which automatic pinning avoids.
+    """
+    host = host or detect_host()
+    name, settings = profile_settings(vm)
+    notes = []
+    ram = int(vm.get("ram", 2048))
+    vcpus = int(vm.get("cpus", DEFAULT_VCPUS))
+    args = []
+
+    accel = settings["accel"]
+    if accel == "auto":
+        accel = "kvm" if host.kvm else "tcg"
+        if not host.kvm:
+            notes.append(f"{KVM_DEVICE} is not available; using TCG emulation (much slower)")
+    args += ["-accel", accel]
+    if settings["cpu"]:
+        # Host passthrough needs KVM; under TCG "max" enables every feature QEMU can emulate
+        args += ["-cpu", settings["cpu"] if accel == "kvm" or settings["cpu"] != "host" else "max"]
+    args += ["-smp", str(vcpus), "-m", str(ram)]
+
+    if settings["hugepages"]:
+        if host.hugepages_free_mb >= ram:
+            args += ["-mem-path", HUGEPAGES_MOUNT, "-mem-prealloc"]
+        else:
+            notes.append(f"Hugepages skipped: {host.hugepages_free_mb} MB free in {HUGEPAGES_MOUNT}, {ram} MB needed")
+
+    if vm.get("disk"):
+        if settings["disk_bus"] == "virtio":
+            cache = settings["cache"] or "writeback"
+            aio = settings["aio"] or "threads"
+            if aio == "auto":
+                aio = "io_uring" if host.io_uring else "native"
+            if aio == "native" and cache not in ("none", "directsync"):
+                notes.append(f"aio=native needs O_DIRECT; using aio=threads with cache={cache}")
+                aio = "threads"
+            drive = f"file={vm['disk']},format=qcow2,if=none,id=disk0,cache={cache},aio={aio},discard=unmap"
+            device = "virtio-blk-pci,drive=disk0"
+            if settings["iothread"]:
+                # Disk I/O completes on its own thread instead of the main loop
+                args += ["-object", "iothread,id=io0"]
+                device += ",iothread=io0"
+            args += ["-drive", drive, "-device", device]
+        else:
+            args += ["-drive", f"file={vm['disk']},format=qcow2"]
+
+    if settings["nic"] == "virtio":
+        args += ["-netdev", "user,id=net0", "-device", "virtio-net-pci,netdev=net0"]
+    if settings["balloon"]:
+        args += ["-device", "virtio-balloon-pci"]
+
+    pin_cpus = []
+    if settings["pin"]:
+        if settings["pin"] == "auto":
+            free = [cpu for cpu in host.cpus if cpu not in set(reserved_cpus)]
+            # Leave the lowest CPUs, where interrupts and the desktop usually run, to the host
+            pin_cpus = sorted(free[-vcpus:]) if len(free) > vcpus else []
+        else:
+            pin_cpus = parse_cpu_list(settings["pin"])
+        if len(pin_cpus) < vcpus:
+            notes.append(f"vCPU pinning skipped: not enough free host CPUs for {vcpus} vCPUs")
+            pin_cpus = []
+    return LaunchPlan(name, args, notes, pin_cpus[:vcpus])
+
+def pin_vcpus(thread_ids, cpus):
+    """Pins each vCPU thread (thread-id from QMP query-cpus-fast) to one host CPU."""
+    for thread_id, cpu in zip(thread_ids, cpus):
+        os.sched_setaffinity(thread_id, {cpu})
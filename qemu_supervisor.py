@@ -0,0 +1,156 @@
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+from qemu_profiles import plan_launch
+
+# --- Configuration ---
+# Override with the QEMU_BINARY environment variable, e.g. a stub script for testing.
+QEMU_BINARY = os.environ.get("QEMU_BINARY", "qemu-system-x86_64")
+BOOT_GRACE_SECONDS = 1.0 # A VM still alive after this long counts as running
+STOP_TIMEOUT_SECONDS = 5.0 # Time allowed after SIGTERM before the process is killed
+
+# Lifecycle states
+STATE_BOOTING = "booting"
+STATE_RUNNING = "running"
+STATE_STOPPING = "stopping"
+STATE_EXITED = "exited"
+
+def qmp_socket_path(vm_name):
+    """Per-user location of a VM's QMP monitor socket."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", vm_name)
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return os.path.join(runtime_dir, f"qemu-manager-{user}", f"{safe}.qmp")
+
+def build_command(vm, binary=QEMU_BINARY, host=None):
+    """
+    Builds the qemu-system command line for a VM definition dict. Acceleration, CPU, memory,
+    disk and network arguments come from the VM's performance profile (see qemu_profiles.py);
+    pass a HostCapabilities as host to build the command for a machine other than this one.
+    """
+    command = [binary, "-name", vm["name"]] + plan_launch(vm, host).args
+    if vm.get("iso"):
+        command += ["-cdrom", vm["iso"], "-boot", "d"]
+    if vm.get("restore_snapshot"):
+        # Resume from a qcow2 internal snapshot instead of a cold boot
+        command += ["-loadvm", vm["restore_snapshot"]]
+    # Route the guest serial console to stdout so it can be streamed into the console pane
+    command += ["-serial", "stdio"]
+    # Machine protocol monitor for live stats (see qmp_client.py)
+    command += ["-qmp", f"unix:{qmp_socket_path(vm['name'])},server=on,wait=off"]
+    return command
+
+class VmProcess:
+    """One running QEMU process with reader threads for stdout and stderr."""
+
+    def __init__(self, name, command, on_output, on_state):
+        self.name = name
+        self.command = command
+        self.on_output = on_output # on_output(name, line, stream_name)
+        self.on_state = on_state # on_state(name, state, exit_code)
+        self.state = None
+        self.exit_code = None
+        self.process = None
+
+    def start(self):
+        socket_dir = os.path.dirname(qmp_socket_path(self.name))
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        self._set_state(STATE_BOOTING)
+        for stream, stream_name in ((self.process.stdout, "stdout"), (self.process.stderr, "stderr")):
+            threading.Thread(target=self._read_stream, args=(stream, stream_name), daemon=True).start()
+        threading.Thread(target=self._wait, daemon=True).start()
+
+    def _read_stream(self, stream, stream_name):
+        for raw in iter(stream.readline, b""):
+            self.on_output(self.name, raw.decode("utf-8", errors="replace").rstrip("\r\n"), stream_name)
+        stream.close()
+
+    def _wait(self):
+        try:
+            self.process.wait(timeout=BOOT_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            if self.state == STATE_BOOTING:
+                self._set_state(STATE_RUNNING)
+            self.process.wait()
+        self.exit_code = self.process.returncode
+        self._set_state(STATE_EXITED)
+
+    def _set_state(self, state):
+        self.state = state
+        self.on_state(self.name, state, self.exit_code)
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout=STOP_TIMEOUT_SECONDS):
+        """Terminates the process, killing it if it ignores SIGTERM. Runs the wait in a thread."""
+        if not self.is_alive():
+            return
+        self._set_state(STATE_STOPPING)
+        self.process.terminate()
+
+        def _escalate():
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        threading.Thread(target=_escalate, daemon=True).start()
+
+class QemuSupervisor:
+    """Launches and tracks any number of QEMU processes, one VmProcess per VM name."""
+
+    def __init__(self, on_output, on_state, binary=QEMU_BINARY):
+        self.on_output = on_output
+        self.on_state = on_state
+        self.binary = binary
+        self.vms = {}
+        self.lock = threading.Lock()
+
+    def build_command(self, vm):
+        return build_command(vm, self.binary)
+
+    def start(self, vm):
+        """
+        Launches a VM. Raises RuntimeError if it is already running and
+        FileNotFoundError if the qemu binary cannot be found.
+        """
+        with self.lock:
+            current = self.vms.get(vm["name"])
+            if current is not None and current.is_alive():
+                raise RuntimeError(f"VM '{vm['name']}' is already running")
+            proc = VmProcess(vm["name"], self.build_command(vm), self.on_output, self.on_state)
+            # Registered first so state callbacks fired during start() can look the process up
+            self.vms[vm["name"]] = proc
+            try:
+                proc.start()
+            except OSError:
+                del self.vms[vm["name"]]
+                raise
+        return proc
+
+    def stop(self, name):
+        proc = self.vms.get(name)
+        if proc is not None:
+            proc.stop()
+
+    def state(self, name):
+        proc = self.vms.get(name)
+        return proc.state if proc is not None else None
+
+    def is_running(self, name):
+        proc = self.vms.get(name)
+        return proc is not None and proc.is_alive()
+
+    def stop_all(self):
+        for proc in list(self.vms.values()):
+            proc.stop()
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+# --- Configuration ---
+DEFAULT_INTERVAL = 2.0 # Seconds between stats samples per VM
+CONNECT_RETRY_SECONDS = 0.5 # QEMU creates the socket shortly after launch
+CONNECT_ATTEMPTS = 40
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+class QmpError(Exception):
+    """Raised when QEMU answers a command with an error or the connection fails."""
+
+class QmpClient:
+    """Minimal asyncio client for QEMU's machine protocol monitor over a unix socket."""
+
+    def __init__(self, path):
+        self.path = path
+        self.reader = None
+        self.writer = None
+        self.greeting = None
+        self._next_id = 0
+        self._lock = asyncio.Lock() # One command in flight; samplers and user commands share the socket
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.greeting = await self._read_message()
+        if "QMP" not in self.greeting:
+            raise QmpError(f"Unexpected QMP greeting: {self.greeting}")
+        await self.execute("qmp_capabilities")
+
+    async def _read_message(self):
+        line = await self.reader.readline()
+        if not line:
+            raise QmpError("QMP connection closed")
+        return json.loads(line)
+
+    async def execute(self, command, arguments=None):
+        """Sends a command and returns its "return" value, skipping asynchronous events."""
+        async with self._lock:
+            self._next_id += 1
+            request = {"execute": command, "id": self._next_id}
+            if arguments:
+                request["arguments"] = arguments
+            self.writer.write(json.dumps(request).encode() + b"\n")
+            await self.writer.drain()
+            while True:
+                message = await self._read_message()
+                if "event" in message:
+                    continue
+                if message.get("id") not in (None, self._next_id):
+                    continue
+                if "error" in message:
+                    raise QmpError(f"{command}: {message['error'].get('desc', message['error'])}")
+                return message.get("return")
+
+    async def human_command(self, command_line):
+        """Runs a human monitor (HMP) command such as savevm; HMP reports failures as text."""
+        output = await self.execute("human-monitor-command", {"command-line": command_line})
+        if output and output.strip():
+            raise QmpError(output.strip())
+        return output
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.writer = None
+
+def _thread_cpu_seconds(pid, thread_ids):
+    """Total user+system CPU time of the given threads, read from /proc (None where unavailable)."""
+    total = 0
+    for tid in thread_ids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/stat") as f:
+                # Fields after the parenthesised command name; utime and stime are 14 and 15
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+        except (OSError, IndexError, ValueError):
+            return None
+    return total / CLOCK_TICKS
+
+async def sample_stats(client):
+    """Collects run state, vCPU threads, guest memory and block I/O totals over one connection."""
+    stats = {"status": (await client.execute("query-status")).get("status")}
+    cpus = await client.execute("query-cpus-fast")
+    stats["vcpus"] = len(cpus)
+    stats["vcpu_threads"] = [cpu.get("thread-id") for cpu in cpus if cpu.get("thread-id")]
+    try:
+        stats["memory_mb"] = (await client.execute("query-balloon"))["actual"] // (1024 * 1024)
+    except QmpError:
+        # No balloon device: report the RAM the guest was started with instead
+        try:
+            stats["memory_mb"] = (await client.execute("query-memory-size-summary"))["base-memory"] // (1024 * 1024)
+        except (QmpError, KeyError):
+            stats["memory_mb"] = None
+    read_bytes = written_bytes = read_ops = write_ops = 0
+    for device in await client.execute("query-blockstats"):
+        io = device.get("stats", {})
+        read_bytes += io.get("rd_bytes", 0)
+        written_bytes += io.get("wr_bytes", 0)
+        read_ops += io.get("rd_operations", 0)
+        write_ops += io.get("wr_operations", 0)
+    stats.update(read_bytes=read_bytes, written_bytes=written_bytes, read_ops=read_ops, write_ops=write_ops)
+    return stats
+
+class QmpMonitor:
+    """
+    Polls the QMP sockets of any number of VMs from one asyncio loop on one thread.
+    on_stats(name, stats) is called from that thread only when a VM's displayed values change;
+    stats includes the vCPU thread ids ("vcpu_threads"), which do not count as a change.
+    """
+
+    def __init__(self, on_stats, interval=DEFAULT_INTERVAL):
+        self.on_stats = on_stats
+        self.interval = interval
+        self.loop = asyncio.new_event_loop()
+        self.tasks = {}
+        self.clients = {} # Live connections by VM name, shared with execute()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def set_interval(self, seconds):
+        self.interval = max(0.1, float(seconds))
+
+    def add(self, name, socket_path, pid=None):
+        """Starts watching a VM; pid enables per-vCPU CPU usage from /proc."""
+        self.remove(name)
+        self.tasks[name] = asyncio.run_coroutine_threadsafe(self._watch(name, socket_path, pid), self.loop)
+
+    def remove(self, name):
+        task = self.tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    def execute(self, name, command, arguments=None):
+        """
+        Runs a QMP command on a watched VM's connection (QEMU accepts one QMP client per socket).
+        Returns a concurrent.futures.Future; callable from any thread.
+        """
+        return asyncio.run_coroutine_threadsafe(self._execute(name, command, arguments), self.loop)
+
+    def human_command(self, name, command_line):
+        """Like execute(), for HMP commands such as "savevm <tag>"."""
+        return asyncio.run_coroutine_threadsafe(self._execute(name, None, command_line), self.loop)
+
+    async def _execute(self, name, command, arguments):
+        client = self.clients.get(name)
+        if client is None:
+            raise QmpError(f"No QMP connection to '{name}'")
+        if command is None:
+            return await client.human_command(arguments)
+        return await client.execute(command, arguments)
+
+    def stop(self):
+        for name in list(self.tasks):
+            self.remove(name)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _connect(self, socket_path):
+        for _ in range(CONNECT_ATTEMPTS):
+            client = QmpClient(socket_path)
+            try:
+                await client.connect()
+                return client
+            except (OSError, QmpError):
+                await client.close()
+                await asyncio.sleep(CONNECT_RETRY_SECONDS)
+        raise QmpError(f"Could not connect to QMP socket {socket_path}")
+
+    async def _watch(self, name, socket_path, pid):
+        client = None
+        last_shown = None
+        last_cpu = None
+        try:
+            client = await self._connect(socket_path)
+            self.clients[name] = client
+            while True:
+                stats = await sample_stats(client)
+                now = time.monotonic()
+                cpu_seconds = _thread_cpu_seconds(pid, stats["vcpu_threads"]) if pid else None
+                stats["cpu_percent"] = None
+                if cpu_seconds is not None and last_cpu is not None and now > last_cpu[1]:
+                    stats["cpu_percent"] = round(100 * (cpu_seconds - last_cpu[0]) / (now - last_cpu[1]))
+                if cpu_seconds is not None:
+                    last_cpu = (cpu_seconds, now)
+                shown = {k: v for k, v in stats.items() if k != "vcpu_threads"}
+                if shown != last_shown:
+                    last_shown = shown
+                    self.on_stats(name, stats)
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            raise
+        except (OSError, QmpError, ValueError) as e:
+            # The VM went away or never exposed QMP; report once and stop watching it
+            self.on_stats(name, {"error": str(e)})
+        finally:
+            if client is not None:
+                if self.clients.get(name) is client:
+                    del self.clients[name]
+                await client.close()
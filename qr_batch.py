@@ -0,0 +1,286 @@
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import qrcode
+
+from fjfujgji import render_qr_code
+from qr_cache import DEFAULT_MAX_BYTES, QrCache
+
+# --- Configuration ---
+DEFAULT_CHUNK_SIZE = 64 # Payloads handed to a worker process per task
+ERROR_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+class PayloadError(ValueError):
+    """Stands in for the data of an input line that could not be parsed."""
+
+def read_payloads(source, fmt=None):
+    """
+    Yields (data, filename) pairs from a CSV or NDJSON file, or stdin when source is "-".
+    CSV rows use a "data" column (or the first column) and an optional "filename" column.
+    NDJSON lines are either JSON values or objects with "data" and optional "filename";
+    data that is not a string is converted with str().
+    A malformed line yields a PayloadError as its data, so it fails alone and keeps its index.
+    """
+    if fmt is None:
+        fmt = "ndjson" if source.endswith((".ndjson", ".jsonl")) else "csv"
+    stream = sys.stdin if source == "-" else open(source, newline="", encoding="utf-8")
+    try:
+        if fmt == "ndjson":
+            for number, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield PayloadError(f"line {number}: invalid JSON ({e})"), None
+                    continue
+                if not isinstance(record, dict):
+                    yield str(record), None
+                elif record.get("data") is None:
+                    yield PayloadError(f"line {number}: no \"data\" field"), record.get("filename")
+                else:
+                    data = record["data"]
+                    yield data if isinstance(data, str) else str(data), record.get("filename")
+        else:
+            reader = csv.reader(stream)
+            header = next(reader, None)
+            if header is None:
+                return
+            lowered = [h.strip().lower() for h in header]
+            if "data" in lowered:
+                data_col = lowered.index("data")
+                name_col = lowered.index("filename") if "filename" in lowered else None
+            else:
+                # No header row: the first line is already a payload
+                data_col, name_col = 0, None
+                yield header[0], None
+            for row in reader:
+                if not row:
+                    continue
+                name = row[name_col] if name_col is not None and name_col < len(row) else None
+                if data_col >= len(row):
+                    yield PayloadError(f"line {reader.line_num}: no data column"), name or None
+                    continue
+                yield row[data_col], name or None
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def safe_filename(name, index):
+    """Returns a flat, filesystem-safe PNG name for an item."""
+    if not name:
+        return f"qr_{index:06d}.png"
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", os.path.basename(name)).strip("._") or f"qr_{index:06d}"
+    return name if name.lower().endswith(".png") else name + ".png"
+
+_worker_caches = {} # Per-process QrCache instances, keyed by cache directory
+
+def _worker_cache(cache_dir):
+    if cache_dir is None:
+        return None
+    if cache_dir not in _worker_caches:
+        # Workers never evict; the parent trims once the batch is done
+        _worker_caches[cache_dir] = QrCache(cache_dir, max_bytes=None)
+    return _worker_caches[cache_dir]
+
+def render_chunk(chunk, out_dir, settings, cache_dir=None):
+    """
+    Worker entry point: renders a list of (index, data, filename) items.
+    Files are written straight into out_dir, or returned as PNG bytes when out_dir is None.
+    Returns (index, filename, png_bytes, error, cached) per item; one bad item never sinks the chunk.
+    """
+    cache = _worker_cache(cache_dir)
+    results = []
+    for index, data, filename in chunk:
+        try:
+            if isinstance(data, PayloadError):
+                raise data
+            if out_dir is None:
+                buffer = io.BytesIO()
+                cached = render_qr_code(data, buffer, cache=cache, **settings)
+                png = buffer.getvalue()
+            else:
+                cached = render_qr_code(data, os.path.join(out_dir, filename), cache=cache, **settings)
+                png = None
+            results.append((index, filename, png, None, cached))
+        except Exception as e:
+            results.append((index, filename, None, f"{type(e).__name__}: {e}", False))
+    return results
+
+class ArchiveWriter:
+    """Appends PNGs to a .zip, .tar or .tar.gz archive from the parent process only."""
+
+    def __init__(self, path):
+        self.path = path
+        if path.endswith(".zip"):
+            # PNG data is already deflated, storing avoids compressing it twice
+            self.zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED)
+            self.tar = None
+        else:
+            mode = "w:gz" if path.endswith((".tar.gz", ".tgz")) else "w"
+            self.tar = tarfile.open(path, mode)
+            self.zip = None
+
+    def add(self, filename, png):
+        if self.zip is not None:
+            self.zip.writestr(filename, png)
+        else:
+            info = tarfile.TarInfo(filename)
+            info.size = len(png)
+            info.mtime = int(time.time())
+            self.tar.addfile(info, io.BytesIO(png))
+
+    def close(self):
+        (self.zip or self.tar).close()
+
+def is_archive(path):
+    return path.endswith((".zip", ".tar", ".tar.gz", ".tgz"))
+
+def _chunks(payloads, chunk_size):
+    chunk = []
+    for index, (data, name) in enumerate(payloads):
+        chunk.append((index, data, safe_filename(name, index)))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def generate_batch(payloads, output, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                   error_report=None, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, **settings):
+    """
+    Renders every (data, filename) pair across a process pool.
+    output is a directory or a .zip/.tar/.tar.gz archive.
+    At most two chunks per worker are in flight, so memory stays bounded for any input size.
+    With cache_dir, rendered codes are shared through a QrCache trimmed to cache_max_bytes.
+    Returns a summary dict with counts, elapsed time, cache counters and per-item errors.
+    """
+    workers = workers or os.cpu_count() or 1
+    archive = ArchiveWriter(output) if is_archive(output) else None
+    out_dir = None
+    if archive is None:
+        os.makedirs(output, exist_ok=True)
+        out_dir = output
+
+    ok = 0
+    hits = 0
+    errors = []
+    started = time.perf_counter()
+    chunks = _chunks(payloads, chunk_size)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                    else:
+                        pending.add(pool.submit(render_chunk, chunk, out_dir, settings, cache_dir))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for index, filename, png, error, cached in future.result():
+                        if error:
+                            errors.append({"index": index, "filename": filename, "error": error})
+                            continue
+                        hits += cached
+                        if archive is not None:
+                            archive.add(filename, png)
+                        ok += 1
+    finally:
+        if archive is not None:
+            archive.close()
+
+    elapsed = time.perf_counter() - started
+    evictions = 0
+    if cache_dir is not None:
+        cache = QrCache(cache_dir, max_bytes=cache_max_bytes)
+        cache.trim()
+        evictions = cache.evictions
+    errors.sort(key=lambda e: e["index"])
+    if error_report and errors:
+        with open(error_report, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["index", "filename", "error"])
+            writer.writeheader()
+            writer.writerows(errors)
+    return {
+        "generated": ok,
+        "failed": len(errors),
+        "seconds": elapsed,
+        "per_second": ok / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+        "cache_hits": hits if cache_dir is not None else None,
+        "cache_misses": ok - hits if cache_dir is not None else None,
+        "cache_evictions": evictions,
+        "errors": errors,
+    }
+
+def print_summary(summary, output):
+    print(f"Generated {summary['generated']} QR codes into {os.path.abspath(output)}")
+    print(f"Failed: {summary['failed']}")
+    print(f"Elapsed: {summary['seconds']:.2f}s with {summary['workers']} workers "
+          f"({summary['per_second']:.1f} codes/s)")
+    if summary["cache_hits"] is not None:
+        print(f"Cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses, "
+              f"{summary['cache_evictions']} evicted")
+    for error in summary["errors"][:10]:
+        print(f"  [ERROR] #{error['index']} {error['filename']}: {error['error']}")
+    if summary["failed"] > 10:
+        print(f"  ... {summary['failed'] - 10} more, see the error report")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch QR code generation across a process pool.")
+    parser.add_argument("input", help="CSV or NDJSON file with payloads, or - for stdin")
+    parser.add_argument("-o", "--output", default="qrcodes", help="Output directory or .zip/.tar/.tar.gz archive")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Input format (default: from file extension)")
+    parser.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--errors", dest="error_report", help="Write failed items to this CSV file")
+    parser.add_argument("--version", dest="qr_version", type=int, default=1)
+    parser.add_argument("--error-correction", choices=sorted(ERROR_LEVELS), default="L")
+    parser.add_argument("--box-size", type=int, default=10)
+    parser.add_argument("--border", type=int, default=4)
+    parser.add_argument("--backend", choices=["pil", "numpy"], default="pil", help="Image backend")
+    parser.add_argument("--cache-dir", help="Reuse rendered codes from this cache directory")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Cache size cap in MB")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("ndjson" if args.input == "-" else None)
+    summary = generate_batch(
+        read_payloads(args.input, fmt),
+        args.output,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        error_report=args.error_report,
+        cache_dir=args.cache_dir,
+        cache_max_bytes=args.cache_size * 1024 * 1024,
+        version=args.qr_version,
+        error_correction=ERROR_LEVELS[args.error_correction],
+        box_size=args.box_size,
+        border=args.border,
+        backend=args.backend,
+    )
+    print_summary(summary, args.output)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
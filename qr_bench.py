@@ -0,0 +1,184 @@
+import argparse
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import platform
+import random
+import string
+import sys
+import time
+
+try:
+    import resource # Peak RSS; not available on Windows
+except ImportError:
+    resource = None
+
+import qrcode
+import qrcode.image.svg
+
+from fjfujgji import QR_SETTINGS, render_qr_code
+
+# --- Benchmark matrix ---
+PAYLOAD_LENGTHS = [16, 64, 256, 1024]
+ERROR_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+BOX_SIZES = [4, 10]
+FORMATS = ["png-pil", "png-numpy", "svg"]
+DEFAULT_ITERATIONS = 200
+WARMUP_ITERATIONS = 5
+
+def make_payloads(length, count, seed=0):
+    """Deterministic URL-like payloads so two runs encode exactly the same data."""
+    rng = random.Random(f"{seed}-{length}")
+    alphabet = string.ascii_letters + string.digits
+    prefix = "https://yourwebsite.com/"
+    return [prefix + "".join(rng.choices(alphabet, k=max(length - len(prefix), 1)))
+            for _ in range(count)]
+
+def render(data, fmt, settings):
+    """Renders one code in the given output format into memory."""
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        qr = qrcode.QRCode(**settings)
+        qr.add_data(data)
+        qr.make(fit=True)
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        render_qr_code(data, buffer, backend=fmt.split("-", 1)[1], **settings)
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def run_case(case):
+    """Times one matrix cell; runs in its own process so peak RSS is per case."""
+    settings = {**QR_SETTINGS, "error_correction": ERROR_LEVELS[case["error_correction"]],
+                "box_size": case["box_size"]}
+    if case["version"] is not None:
+        settings["version"] = case["version"]
+    payloads = make_payloads(case["payload_length"], case["iterations"])
+
+    for data in payloads[:WARMUP_ITERATIONS]:
+        render(data, case["format"], settings)
+
+    latencies = []
+    started = time.perf_counter()
+    for data in payloads:
+        t0 = time.perf_counter()
+        render(data, case["format"], settings)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        **case,
+        "codes_per_second": len(payloads) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+def case_key(result):
+    return (f"{result['format']}/len{result['payload_length']}/"
+            f"{result['error_correction']}/box{result['box_size']}")
+
+def build_cases(lengths, levels, boxes, formats, iterations, version):
+    return [
+        {"format": fmt, "payload_length": length, "error_correction": level,
+         "box_size": box, "iterations": iterations, "version": version}
+        for fmt, length, level, box in itertools.product(formats, lengths, levels, boxes)
+    ]
+
+def run_benchmark(cases, quiet=False):
+    """Runs every case in a fresh process and returns the results document."""
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for case in cases:
+        # maxtasksperchild=1 gives each case a clean process, so RSS peaks do not leak between cases
+        with ctx.Pool(1, maxtasksperchild=1) as pool:
+            result = pool.apply(run_case, (case,))
+        results.append(result)
+        if not quiet:
+            rss = f"{result['peak_rss_kb'] / 1024:.1f} MB" if result["peak_rss_kb"] is not None else "n/a"
+            print(f"{case_key(result):32} {result['codes_per_second']:9.1f} codes/s  "
+                  f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+                  f"p99 {result['p99_ms']:7.2f} ms  rss {rss}")
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+def compare(baseline, candidate):
+    """Prints per-case throughput and p95 changes between two result files."""
+    base = {case_key(r): r for r in baseline["results"]}
+    print(f"{'case':32} {'codes/s':>21} {'change':>8} {'p95 ms':>19} {'change':>8}")
+    for result in candidate["results"]:
+        key = case_key(result)
+        old = base.get(key)
+        if old is None:
+            print(f"{key:32} (new case)")
+            continue
+        speed = (result["codes_per_second"] / old["codes_per_second"] - 1) * 100 if old["codes_per_second"] else 0.0
+        p95 = (result["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        print(f"{key:32} {old['codes_per_second']:9.1f} -> {result['codes_per_second']:9.1f} {speed:+7.1f}% "
+              f"{old['p95_ms']:7.2f} -> {result['p95_ms']:7.2f} {p95:+7.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QR generation benchmark.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmark matrix")
+    run.add_argument("-o", "--output", default="qr_bench.json", help="Where to store the JSON results")
+    run.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS)
+    run.add_argument("--lengths", type=int, nargs="+", default=PAYLOAD_LENGTHS)
+    run.add_argument("--levels", nargs="+", choices=sorted(ERROR_LEVELS), default=list(ERROR_LEVELS))
+    run.add_argument("--box-sizes", type=int, nargs="+", default=BOX_SIZES)
+    run.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    run.add_argument("--version", dest="qr_version", type=int, default=QR_SETTINGS["version"],
+                     help="Starting QR version (make(fit=True) grows it as needed)")
+
+    cmp = sub.add_parser("compare", help="Compare two result files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        compare(baseline, candidate)
+        return 0
+
+    cases = build_cases(args.lengths, args.levels, args.box_sizes, args.formats,
+                        args.iterations, args.qr_version)
+    report = run_benchmark(cases)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
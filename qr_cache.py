@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# --- Configuration ---
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "qrcodes")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024 # 512 MB
+TRIM_TARGET = 0.9 # Evict down to 90% of the cap so every store does not trigger a trim
+
+class QrCache:
+    """
+    Content-addressed store of rendered QR PNGs.
+    Entries live at <root>/<k[:2]>/<k[2:4]>/<k>.png where k is the SHA-256 of the payload
+    and render parameters. A file's mtime is its last use, which drives LRU eviction.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None # Bytes on disk, computed lazily on first store
+
+    @staticmethod
+    def key(data, settings):
+        """Hashes the payload together with the settings that affect the pixels."""
+        params = json.dumps({"data": data, **settings}, sort_keys=True, default=str)
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key + ".png")
+
+    def fetch(self, key, output):
+        """
+        Copies a cached PNG to output (a path or a binary file object).
+        Always a copy, never a hardlink: a later write to output must not change the entry.
+        Returns False on a miss.
+        """
+        path = self.path_for(key)
+        try:
+            os.utime(path) # Mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+
+        try:
+            if hasattr(output, "write"):
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, output)
+            else:
+                if os.path.lexists(output):
+                    os.remove(output) # A link left by an older run must not be written through
+                shutil.copyfile(path, output)
+        except FileNotFoundError:
+            # Evicted by another process between the check and the copy
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, png):
+        """Adds PNG bytes (or the file at a path) to the cache and trims it if it grew past the cap."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(png, (bytes, bytearray)):
+                    f.write(png)
+                else:
+                    with open(png, "rb") as src:
+                        shutil.copyfileobj(src, f)
+            size = os.path.getsize(tmp)
+            # Atomic, so concurrent workers never expose a half-written entry
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        if self._size is not None:
+            self._size += size
+        if self.max_bytes is not None and self.size() > self.max_bytes:
+            self.trim()
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".png"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue # Evicted by another process meanwhile
+                    yield st.st_mtime, st.st_size, path
+
+    def size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def trim(self):
+        """Evicts least recently used entries until the cache is back under its cap."""
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * TRIM_TARGET
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._size = total
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
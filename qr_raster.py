@@ -0,0 +1,44 @@
+import struct
+import zlib
+
+import numpy as np
+
+# --- PNG constants ---
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+COMPRESSION_LEVEL = 6 # zlib level; PNG rows of a QR code compress well at any level
+
+def rasterize(qr):
+    """
+    Builds the bitmap of a made QRCode in one vectorized pass.
+    Returns a boolean array (True = white) matching qr.make_image(fill_color="black", back_color="white").
+    """
+    # get_matrix() already includes the quiet-zone border; True marks a dark module
+    modules = np.asarray(qr.get_matrix(), dtype=bool)
+    box = qr.box_size
+    return np.repeat(np.repeat(~modules, box, axis=0), box, axis=1)
+
+def _chunk(kind, payload):
+    return (struct.pack(">I", len(payload)) + kind + payload
+            + struct.pack(">I", zlib.crc32(kind + payload) & 0xFFFFFFFF))
+
+def encode_png(pixels):
+    """Encodes a boolean bitmap (True = white) as a 1-bit grayscale PNG."""
+    height, width = pixels.shape
+    # Pack 8 pixels per byte, MSB first, and prefix every scanline with filter type 0
+    rows = np.packbits(pixels, axis=1)
+    scanlines = np.zeros((height, rows.shape[1] + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rows
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    return (PNG_SIGNATURE
+            + _chunk(b"IHDR", header)
+            + _chunk(b"IDAT", zlib.compress(scanlines.tobytes(), COMPRESSION_LEVEL))
+            + _chunk(b"IEND", b""))
+
+def save_png(qr, output):
+    """Writes the QR code as a 1-bit PNG to output (a path or a binary file object)."""
+    png = encode_png(rasterize(qr))
+    if hasattr(output, "write"):
+        output.write(png)
+    else:
+        with open(output, "wb") as f:
+            f.write(png)
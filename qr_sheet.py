@@ -0,0 +1,246 @@
+import argparse
+import os
+import sys
+import zlib
+
+import qrcode
+
+from fjfujgji import QR_SETTINGS
+from qr_batch import ERROR_LEVELS, PayloadError, read_payloads
+
+# --- Page configuration (PostScript points, 1/72 inch) ---
+PAGE_SIZES = {
+    "a4": (595.28, 841.89),
+    "letter": (612.0, 792.0),
+    "a3": (841.89, 1190.55),
+}
+DEFAULT_MARGIN = 36.0 # 0.5 inch
+DEFAULT_GAP = 12.0
+
+def _num(value):
+    """Compact decimal for vector output (no trailing zeros)."""
+    text = f"{value:.3f}".rstrip("0").rstrip(".")
+    return text if text not in ("", "-0") else "0"
+
+def module_runs(matrix):
+    """Yields (x, y, length) for every horizontal run of dark modules."""
+    for y, row in enumerate(matrix):
+        x = 0
+        width = len(row)
+        while x < width:
+            if row[x]:
+                start = x
+                while x < width and row[x]:
+                    x += 1
+                yield start, y, x - start
+            else:
+                x += 1
+
+def qr_matrix(data, settings):
+    """Encodes data with the shared QRCode configuration and returns the bordered module matrix."""
+    qr = qrcode.QRCode(**settings)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+class SheetLayout:
+    """Places codes on a grid of cols x rows square cells per page."""
+
+    def __init__(self, page_size="a4", cols=4, rows=5, margin=DEFAULT_MARGIN, gap=DEFAULT_GAP):
+        self.width, self.height = PAGE_SIZES[page_size] if isinstance(page_size, str) else page_size
+        self.cols = cols
+        self.rows = rows
+        self.margin = margin
+        self.gap = gap
+        cell_w = (self.width - 2 * margin - (cols - 1) * gap) / cols
+        cell_h = (self.height - 2 * margin - (rows - 1) * gap) / rows
+        self.cell = min(cell_w, cell_h)
+        if self.cell <= 0:
+            raise ValueError("Page too small for the requested grid")
+
+    @property
+    def per_page(self):
+        return self.cols * self.rows
+
+    def cell_origin(self, slot):
+        """Top-left corner of a slot, measured from the top-left of the page."""
+        row, col = divmod(slot, self.cols)
+        return (self.margin + col * (self.cell + self.gap),
+                self.margin + row * (self.cell + self.gap))
+
+class SvgSheetWriter:
+    """Writes one SVG file per page (name_0001.svg, ...), streaming each code as a single path."""
+
+    def __init__(self, path, layout):
+        self.base, _ = os.path.splitext(path)
+        self.layout = layout
+        self.pages = []
+        self.f = None
+
+    def begin_page(self):
+        path = f"{self.base}_{len(self.pages) + 1:04d}.svg"
+        self.pages.append(path)
+        w, h = _num(self.layout.width), _num(self.layout.height)
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                     f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}pt" height="{h}pt" '
+                     f'viewBox="0 0 {w} {h}">\n<rect width="100%" height="100%" fill="#fff"/>\n')
+
+    def add_code(self, matrix, x, y, module):
+        # Module coordinates stay integral; the transform places and scales the whole code
+        d = "".join(f"M{rx} {ry}h{n}v1h-{n}z" for rx, ry, n in module_runs(matrix))
+        self.f.write(f'<path transform="translate({_num(x)} {_num(y)}) scale({_num(module)})" '
+                     f'fill="#000" d="{d}"/>\n')
+
+    def end_page(self):
+        self.f.write("</svg>\n")
+        self.f.close()
+        self.f = None
+
+    def close(self):
+        if self.f is not None:
+            self.end_page()
+
+class PdfSheetWriter:
+    """
+    Minimal streaming PDF writer: every page's content stream is deflated and written
+    as it is produced, so only the xref offsets are kept in memory.
+    """
+
+    def __init__(self, path, layout):
+        self.layout = layout
+        self.f = open(path, "wb")
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 3 # 1 = Catalog, 2 = Pages (written at the end)
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._compressor = None
+        self._stream_length = 0
+        self._content_id = None
+
+    def _begin_obj(self, obj_id):
+        self.offsets[obj_id] = self.f.tell()
+        self.f.write(f"{obj_id} 0 obj\n".encode())
+
+    def _write_stream(self, data):
+        chunk = self._compressor.compress(data.encode("ascii"))
+        self.f.write(chunk)
+        self._stream_length += len(chunk)
+
+    def begin_page(self):
+        self._content_id = self.next_id
+        self.next_id += 3 # content stream, its length, the page object
+        self._begin_obj(self._content_id)
+        # Length is an indirect object written after the stream, so nothing is buffered
+        self.f.write(f"<< /Length {self._content_id + 1} 0 R /Filter /FlateDecode >>\nstream\n".encode())
+        self._compressor = zlib.compressobj()
+        self._stream_length = 0
+        self._write_stream("0 g\n")
+
+    def add_code(self, matrix, x, y, module):
+        # Flip to PDF's bottom-up axis and scale to module units, then fill all runs at once
+        top = self.layout.height - y
+        ops = [f"q {_num(module)} 0 0 {_num(-module)} {_num(x)} {_num(top)} cm\n"]
+        ops.extend(f"{rx} {ry} {n} 1 re\n" for rx, ry, n in module_runs(matrix))
+        ops.append("f Q\n")
+        self._write_stream("".join(ops))
+
+    def end_page(self):
+        tail = self._compressor.flush()
+        self.f.write(tail)
+        self._stream_length += len(tail)
+        self.f.write(b"\nendstream\nendobj\n")
+        self._begin_obj(self._content_id + 1)
+        self.f.write(f"{self._stream_length}\nendobj\n".encode())
+        page_id = self._content_id + 2
+        self._begin_obj(page_id)
+        self.f.write(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_num(self.layout.width)} "
+                     f"{_num(self.layout.height)}] /Contents {self._content_id} 0 R >>\nendobj\n".encode())
+        self.page_ids.append(page_id)
+        self._compressor = None
+
+    def close(self):
+        if self._compressor is not None:
+            self.end_page()
+        self._begin_obj(1)
+        self.f.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+        self._begin_obj(2)
+        kids = " ".join(f"{pid} 0 R" for pid in self.page_ids)
+        self.f.write(f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>\nendobj\n".encode())
+
+        xref = self.f.tell()
+        size = self.next_id
+        self.f.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, size):
+            if obj_id in self.offsets:
+                self.f.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode())
+            else:
+                self.f.write(b"0000000000 65535 f \n")
+        self.f.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self.f.close()
+
+def generate_sheets(payloads, output, layout=None, **settings):
+    """
+    Lays out QR codes for every payload on pages and streams them to output.
+    A .pdf output is one multi-page document; .svg writes one numbered file per page.
+    Keyword arguments override QR_SETTINGS (box_size does not apply to vector output).
+    Payloads that cannot be encoded are skipped without leaving a gap.
+    Returns (codes, pages, errors) where errors lists (index, message) pairs.
+    """
+    layout = layout or SheetLayout()
+    settings = {**QR_SETTINGS, **settings}
+    writer_cls = PdfSheetWriter if output.lower().endswith(".pdf") else SvgSheetWriter
+    writer = writer_cls(output, layout)
+
+    count = 0
+    pages = 0
+    errors = []
+    try:
+        for index, data in enumerate(payloads):
+            try:
+                if isinstance(data, PayloadError):
+                    raise data
+                matrix = qr_matrix(data, settings)
+            except Exception as e:
+                errors.append((index, f"{type(e).__name__}: {e}"))
+                continue
+            slot = count % layout.per_page
+            if slot == 0:
+                if pages:
+                    writer.end_page()
+                writer.begin_page()
+                pages += 1
+            x, y = layout.cell_origin(slot)
+            writer.add_code(matrix, x, y, layout.cell / len(matrix))
+            count += 1
+    finally:
+        writer.close()
+    return count, pages, errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lay out QR codes on SVG or PDF sheets.")
+    parser.add_argument("input", help="CSV or NDJSON file with payloads, or - for stdin")
+    parser.add_argument("-o", "--output", default="qr_sheet.pdf", help="Output .pdf or .svg (one file per page)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Input format (default: from file extension)")
+    parser.add_argument("--page-size", choices=sorted(PAGE_SIZES), default="a4")
+    parser.add_argument("--cols", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN, help="Page margin in points")
+    parser.add_argument("--gap", type=float, default=DEFAULT_GAP, help="Space between codes in points")
+    parser.add_argument("--error-correction", choices=sorted(ERROR_LEVELS), default="L")
+    parser.add_argument("--border", type=int, default=QR_SETTINGS["border"])
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("ndjson" if args.input == "-" else None)
+    layout = SheetLayout(args.page_size, args.cols, args.rows, args.margin, args.gap)
+    payloads = (data for data, _ in read_payloads(args.input, fmt))
+    codes, pages, errors = generate_sheets(payloads, args.output, layout,
+                                   error_correction=ERROR_LEVELS[args.error_correction],
+                                   border=args.border)
+    print(f"Laid out {codes} QR codes on {pages} pages ({layout.per_page} per page) -> {args.output}")
+    for index, error in errors:
+        print(f"  [ERROR] #{index}: {error}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
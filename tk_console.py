@@ -0,0 +1,138 @@
+import collections
+import tkinter as tk
+
+# --- Configuration ---
+DEFAULT_MAX_LINES = 5000
+DEFAULT_FPS = 30
+
+class BatchedConsole:
+    """
+    Buffers text for a Tk Text widget and flushes it in one insert per frame.
+    write() is safe to call from any thread; everything else runs on the Tk thread.
+    Scrollback is capped at max_lines, trimming old lines in chunks so the
+    delete cost is paid once per chunk rather than once per line.
+    Given a UiEvents dispatcher, flushes ride on its tick instead of a timer of their own.
+    Text goes in at index, which may be a mark (e.g. one that keeps typed input below output).
+    """
+
+    def __init__(self, widget, max_lines=DEFAULT_MAX_LINES, fps=DEFAULT_FPS, events=None, index=tk.END):
+        self.widget = widget
+        self.index = index
+        self.max_lines = max_lines
+        self.interval_ms = max(1, int(1000 / fps))
+        self.pending = collections.deque() # Appended from any thread, drained on the Tk thread
+        self.after_id = None
+        self.events = events
+        if events is not None:
+            events.add_tick(self.flush)
+        else:
+            self.start()
+
+    @property
+    def trim_chunk(self):
+        return max(100, self.max_lines // 10)
+
+    def start(self):
+        if self.after_id is None and self.events is None:
+            self.after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def write(self, text, tag=None):
+        """Queues text (include the newline) with an optional tag or tuple of tags. Any chunk size works."""
+        self.pending.append((text, tag))
+
+    def set_max_lines(self, max_lines):
+        self.max_lines = max_lines
+        self._trim(force=True)
+
+    def replace(self, lines, max_lines=None):
+        """Swaps the whole widget content for lines (text, tag pairs or plain strings) and drops anything queued."""
+        self.pending.clear()
+        if max_lines is not None:
+            self.max_lines = max_lines
+        self._with_normal_state(lambda: self.widget.delete("1.0", tk.END))
+        self._insert([(line, None) if isinstance(line, str) else line for line in lines])
+        self._trim(force=True)
+        self.widget.see(tk.END)
+
+    def clear(self):
+        self.replace([])
+
+    def flush(self):
+        """Writes everything queued so far; called every frame by the timer."""
+        batch = []
+        try:
+            while True:
+                batch.append(self.pending.popleft())
+        except IndexError:
+            pass
+        if not batch:
+            return
+        # Lines beyond the cap would be trimmed right after insertion anyway
+        batch = self._tail(batch)
+        # Only follow the output if the user has not scrolled up to read something
+        at_bottom = self.widget.yview()[1] >= 0.999
+        self._insert(batch)
+        self._trim()
+        if at_bottom:
+            self.widget.see(tk.END)
+
+    def _tail(self, batch):
+        """Keeps only the last max_lines lines of a batch, scanning from the end."""
+        lines = 0
+        for i in range(len(batch) - 1, -1, -1):
+            text, tag = batch[i]
+            newlines = text.count("\n")
+            if lines + newlines > self.max_lines:
+                # Cut this item just after the newline that starts the kept lines
+                cut = len(text)
+                for _ in range(self.max_lines - lines + 1):
+                    cut = text.rindex("\n", 0, cut)
+                return [(text[cut + 1:], tag)] + batch[i + 1:]
+            lines += newlines
+        return batch
+
+    def _tick(self):
+        self.after_id = None
+        try:
+            self.flush()
+        finally:
+            self.start()
+
+    def _insert(self, batch):
+        if not batch:
+            return
+        # Merge consecutive items with the same tag, then do a single insert call
+        args = []
+        text_parts = [batch[0][0]]
+        tag = batch[0][1]
+        for text, next_tag in batch[1:]:
+            if next_tag == tag:
+                text_parts.append(text)
+            else:
+                args += ["".join(text_parts), tag or ()]
+                text_parts = [text]
+                tag = next_tag
+        args += ["".join(text_parts), tag or ()]
+        self._with_normal_state(lambda: self.widget.insert(self.index, *args))
+
+    def _trim(self, force=False):
+        lines = int(self.widget.index("end-1c").split(".")[0])
+        excess = lines - self.max_lines
+        if excess > 0 and (force or excess >= self.trim_chunk):
+            self._with_normal_state(lambda: self.widget.delete("1.0", f"{excess + 1}.0"))
+
+    def _with_normal_state(self, action):
+        # Read-only consoles are disabled between writes
+        state = str(self.widget.cget("state"))
+        if state == tk.DISABLED:
+            self.widget.config(state=tk.NORMAL)
+        try:
+            action()
+        finally:
+            if state == tk.DISABLED:
+                self.widget.config(state=tk.DISABLED)
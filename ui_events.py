@@ -0,0 +1,95 @@
+import collections
+import threading
+
+# --- Configuration ---
+DEFAULT_INTERVAL_MS = 50 # Drain period; progress shown at up to 20 updates per second
+
+class UiEvents:
+    """
+    Hands events from worker threads to the Tk thread, which drains them on a fixed tick.
+    progress() keeps only the latest value per kind and key, so byte-level progress costs
+    one widget update per tick however often it is posted. log() lines and call() callbacks
+    are delivered in the order they were posted, with consecutive lines of the same kind
+    handed to their handler as one list. Posting is safe from any thread; handlers and
+    tick callbacks run on the Tk thread.
+    """
+
+    def __init__(self, root, interval_ms=DEFAULT_INTERVAL_MS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.handlers = {}
+        self.ticks = []
+        self.lock = threading.Lock()
+        self.latest = {} # (kind, key) -> args, replaced on every post
+        self.queue = collections.deque() # ("log", kind, line) and ("call", fn, args), in post order
+        self.after_id = None
+        self.start()
+
+    def on(self, kind, handler):
+        """
+        Registers the handler for a kind: called as handler(*args) for progress,
+        handler(lines) for log.
+        """
+        self.handlers[kind] = handler
+
+    def add_tick(self, callback):
+        """Runs callback() on every tick after the queue is drained (e.g. BatchedConsole.flush)."""
+        self.ticks.append(callback)
+
+    def progress(self, kind, *args, key=None):
+        """Posts a value that supersedes any undelivered one with the same kind and key."""
+        with self.lock:
+            self.latest[(kind, key)] = args
+
+    def log(self, kind, line):
+        self.queue.append(("log", kind, line))
+
+    def call(self, fn, *args):
+        """Runs fn(*args) on the Tk thread, in order with log lines."""
+        self.queue.append(("call", fn, args))
+
+    def start(self):
+        if self.after_id is None:
+            self.after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def drain(self):
+        with self.lock:
+            latest, self.latest = self.latest, {}
+        for (kind, _), args in latest.items():
+            self.handlers[kind](*args)
+
+        lines = []
+        lines_kind = None
+        try:
+            while True:
+                item = self.queue.popleft()
+                if item[0] == "log" and item[1] == lines_kind:
+                    lines.append(item[2])
+                    continue
+                if lines:
+                    self.handlers[lines_kind](lines)
+                    lines = []
+                    lines_kind = None
+                if item[0] == "log":
+                    lines_kind, lines = item[1], [item[2]]
+                else:
+                    item[1](*item[2])
+        except IndexError:
+            pass
+        if lines:
+            self.handlers[lines_kind](lines)
+
+        for callback in self.ticks:
+            callback()
+
+    def _tick(self):
+        self.after_id = None
+        try:
+            self.drain()
+        finally:
+            self.start()
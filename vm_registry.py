@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# --- Configuration ---
+PAGE_SIZE = 200 # Rows fetched per sidebar page
+
+def default_config_dir():
+    """Per-user config directory for the VM manager."""
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA", os.path.expanduser("~"))
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
+    return os.path.join(base, "qemu-manager")
+
+DEFAULT_DB_PATH = os.path.join(default_config_dir(), "vms.db")
+
+# Columns stored directly; any other key of a VM dict goes into the JSON settings column
+COLUMNS = ("name", "os_type", "iso", "ram", "scrollback", "state")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vms (
+    name TEXT PRIMARY KEY COLLATE NOCASE,
+    os_type TEXT NOT NULL DEFAULT 'Linux',
+    iso TEXT NOT NULL DEFAULT '',
+    ram INTEGER NOT NULL DEFAULT 2048,
+    scrollback INTEGER NOT NULL DEFAULT 5000,
+    state TEXT NOT NULL DEFAULT 'stopped',
+    settings TEXT NOT NULL DEFAULT '{}',
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vms_state ON vms(state);
+-- Disk image chain per VM: depth 0 is the VM's own disk, higher depths its backing files
+CREATE TABLE IF NOT EXISTS disk_chain (
+    vm TEXT NOT NULL COLLATE NOCASE,
+    depth INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (vm, depth)
+);
+CREATE INDEX IF NOT EXISTS disk_chain_path ON disk_chain(path);
+-- Launch-to-ready times, kind is 'cold' or 'restore'
+CREATE TABLE IF NOT EXISTS boot_times (
+    vm TEXT NOT NULL COLLATE NOCASE,
+    kind TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS boot_times_vm ON boot_times(vm, kind);
+"""
+
+def _like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+class VmRegistry:
+    """
+    SQLite-backed store of VM definitions.
+    The name column is the NOCASE primary key, so sorted and paged listings walk the index
+    instead of loading every row. Safe to call from any thread.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+
+    def _to_row(self, vm):
+        row = {key: vm[key] for key in COLUMNS if key in vm}
+        row["settings"] = json.dumps({k: v for k, v in vm.items() if k not in COLUMNS})
+        return row
+
+    @staticmethod
+    def _from_row(row):
+        vm = {key: row[key] for key in COLUMNS}
+        vm.update(json.loads(row["settings"]))
+        return vm
+
+    def add(self, vm):
+        """Inserts a new VM definition. Raises ValueError if the name is taken."""
+        row = self._to_row(vm)
+        row["created"] = time.time()
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{key}" for key in row)
+        try:
+            with self.lock, self.db:
+                self.db.execute(f"INSERT INTO vms ({columns}) VALUES ({placeholders})", row)
+        except sqlite3.IntegrityError:
+            raise ValueError(f"A VM named '{vm['name']}' already exists")
+
+    def update(self, name, **fields):
+        """Updates columns and/or settings keys of an existing VM."""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT * FROM vms WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            vm = self._from_row(row)
+            vm.update(fields)
+            values = self._to_row(vm)
+            assignments = ", ".join(f"{key} = :{key}" for key in values if key != "name")
+            values["old_name"] = name
+            self.db.execute(f"UPDATE vms SET {assignments} WHERE name = :old_name", values)
+
+    def set_state(self, name, state):
+        with self.lock, self.db:
+            self.db.execute("UPDATE vms SET state = ? WHERE name = ?", (state, name))
+
+    def reset_states(self, state="stopped"):
+        """Marks every VM as stopped; processes do not outlive the manager."""
+        with self.lock, self.db:
+            self.db.execute("UPDATE vms SET state = ? WHERE state != ?", (state, state))
+
+    def delete(self, name):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM vms WHERE name = ?", (name,))
+            self.db.execute("DELETE FROM disk_chain WHERE vm = ?", (name,))
+            self.db.execute("DELETE FROM boot_times WHERE vm = ?", (name,))
+
+    def add_boot_time(self, name, kind, seconds):
+        with self.lock, self.db:
+            self.db.execute("INSERT INTO boot_times (vm, kind, seconds, recorded) VALUES (?, ?, ?, ?)",
+                            (name, kind, seconds, time.time()))
+
+    def boot_time_summary(self, name):
+        """Returns {kind: (average_seconds, count)} for a VM."""
+        with self.lock:
+            rows = self.db.execute("SELECT kind, AVG(seconds), COUNT(*) FROM boot_times "
+                                   "WHERE vm = ? GROUP BY kind", (name,)).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def set_disk_chain(self, name, chain):
+        """Records a VM's disk followed by its backing files, nearest first."""
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM disk_chain WHERE vm = ?", (name,))
+            self.db.executemany("INSERT INTO disk_chain (vm, depth, path) VALUES (?, ?, ?)",
+                                [(name, depth, path) for depth, path in enumerate(chain)])
+
+    def disk_chain(self, name):
+        with self.lock:
+            rows = self.db.execute("SELECT path FROM disk_chain WHERE vm = ? ORDER BY depth", (name,)).fetchall()
+        return [row["path"] for row in rows]
+
+    def image_users(self, path):
+        """Names of the VMs whose disk or backing chain includes path."""
+        with self.lock:
+            rows = self.db.execute("SELECT DISTINCT vm FROM disk_chain WHERE path = ?", (path,)).fetchall()
+        return [row["vm"] for row in rows]
+
+    def get(self, name):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM vms WHERE name = ?", (name,)).fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def exists(self, name):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM vms WHERE name = ?", (name,)).fetchone() is not None
+
+    def names(self, query="", after=None, limit=PAGE_SIZE, state=None):
+        """
+        Returns up to limit VM names in name order, optionally containing query
+        (case-insensitive) and/or in a given state. Pass the last name of the previous
+        page as after to fetch the next one (keyset paging, no OFFSET scans).
+        """
+        clauses = []
+        params = []
+        if query:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(query))
+        if after is not None:
+            clauses.append("name > ?")
+            params.append(after)
+        if state is not None:
+            clauses.append("state = ?")
+            params.append(state)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            rows = self.db.execute(f"SELECT name FROM vms {where} ORDER BY name LIMIT ?",
+                                   (*params, limit)).fetchall()
+        return [row["name"] for row in rows]
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM vms").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
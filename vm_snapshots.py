@@ -0,0 +1,43 @@
+import json
+import time
+
+from disk_images import QEMU_IMG, run_qemu_img
+
+# --- Configuration ---
+DEFAULT_RETENTION = 3 # Snapshots kept per VM; older ones are dropped after each save
+SNAPSHOT_PREFIX = "fastboot-"
+
+def new_snapshot_name():
+    return SNAPSHOT_PREFIX + time.strftime("%Y%m%d-%H%M%S")
+
+def list_snapshots(disk, binary=QEMU_IMG):
+    """
+    Returns the qcow2 internal snapshots of a disk, oldest first, as dicts with
+    name, date (epoch seconds) and vm_state_size (0 for disk-only snapshots).
+    Uses --force-share so the listing also works while the VM is running.
+    """
+    info = json.loads(run_qemu_img(["info", "--force-share", "--output=json", disk], binary))
+    snapshots = [
+        {
+            "name": snap["name"],
+            "date": snap.get("date-sec", 0),
+            "vm_state_size": snap.get("vm-state-size", 0),
+        }
+        for snap in info.get("snapshots", [])
+    ]
+    snapshots.sort(key=lambda snap: snap["date"])
+    return snapshots
+
+def delete_snapshot_offline(disk, name, binary=QEMU_IMG):
+    """Drops a snapshot from a stopped VM's disk. Running VMs need the HMP "delvm" command instead."""
+    run_qemu_img(["snapshot", "-d", name, disk], binary)
+
+def snapshots_to_prune(snapshots, retention=DEFAULT_RETENTION):
+    """Names of the oldest manager-made snapshots beyond the retention limit."""
+    ours = [snap for snap in snapshots if snap["name"].startswith(SNAPSHOT_PREFIX)]
+    excess = len(ours) - max(retention, 1)
+    return [snap["name"] for snap in ours[:excess]] if excess > 0 else []
+
+def resumable(snapshot):
+    """Only snapshots that include RAM/device state can skip the cold boot."""
+    return snapshot["vm_state_size"] > 0